@@ -0,0 +1,78 @@
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from step_records import compact_step  # noqa: E402
+
+# Memory held by a loaded macro with plain step dicts versus step records.
+# The macro is a synthetic recording: key taps with human-ish timing, some
+# clicks and drags, and pauses, written to JSON and read back the way
+# MacroRecorderCore.load_macro reads it.
+
+KEYS = list("abcdefghijklmnopqrstuvwxyz0123456789") + [
+    "space", "enter", "backspace", "tab", "shift", "ctrl_l", "alt_l", "up", "down", "left", "right", "esc"]
+
+
+def synthetic_recording(step_count, seed=0):
+    rng = random.Random(seed)
+    steps = []
+    while len(steps) < step_count:
+        roll = rng.random()
+        steps.append({"type": "delay", "delay": int(rng.lognormvariate(4.5, 0.8)), "unit": "ms"})
+        if roll < 0.85:
+            key = rng.choice(KEYS)
+            steps.append({"type": "press", "key": key})
+            steps.append({"type": "delay", "delay": rng.randint(30, 140), "unit": "ms"})
+            steps.append({"type": "release", "key": key})
+        elif roll < 0.95:
+            steps.append({"type": "mouse_click", "x": rng.randint(0, 1919), "y": rng.randint(0, 1079),
+                          "button": "left", "hold": rng.randint(40, 160)})
+        else:
+            x, y = rng.randint(0, 1919), rng.randint(0, 1079)
+            steps.append({"type": "mouse_press", "x": x, "y": y, "button": "left"})
+            steps.append({"type": "delay", "delay": rng.randint(200, 900), "unit": "ms"})
+            steps.append({"type": "mouse_release", "x": x + rng.randint(-300, 300), "y": y, "button": "left"})
+    return {"sections": [{"name": "Section 1", "steps": steps[:step_count]}], "delays_between": []}
+
+
+def retained_bytes(text, object_hook=None):
+    gc.collect()
+    tracemalloc.start()
+    data = json.loads(text, object_hook=object_hook)
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return data, current, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare memory held by dict steps and step records.")
+    parser.add_argument("--steps", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-ratio", type=float, default=5.0, help="exit non-zero below this reduction")
+    args = parser.parse_args()
+
+    text = json.dumps(synthetic_recording(args.steps, args.seed))
+    plain, plain_bytes, plain_peak = retained_bytes(text)
+    del plain
+    compact, compact_bytes, compact_peak = retained_bytes(text, compact_step)
+    assert json.dumps(compact, default=dict) == text
+    del compact
+
+    ratio = plain_bytes / compact_bytes
+    mb = 1024 * 1024
+    print(f"{args.steps} steps, {len(text) / mb:.1f} MB of JSON")
+    print(f"  dict steps:   {plain_bytes / mb:8.1f} MB held, {plain_peak / mb:8.1f} MB peak")
+    print(f"  step records: {compact_bytes / mb:8.1f} MB held, {compact_peak / mb:8.1f} MB peak")
+    print(f"  reduction:    {ratio:8.1f}x")
+    return 0 if ratio >= args.min_ratio else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+import time
+
+from step_records import json_default
+
+DEFAULT_PATH = "temp_macro.json"
+
+
+def generation_paths(path, generations):
+    return [path] + [f"{path}.{n}" for n in range(1, generations + 1)]
+
+
+def atomic_write_json(path, data, generations=0):
+    atomic_write_text(path, json.dumps(data, default=json_default), generations)
+
+
+def atomic_write_text(path, text, generations=0):
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    # Shift older generations up (path -> path.1 -> path.2 ...) before swapping in
+    paths = generation_paths(path, generations)
+    for older, newer in zip(reversed(paths[:-1]), reversed(paths[1:])):
+        if os.path.exists(older):
+            os.replace(older, newer)
+    os.replace(tmp, path)
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def recover(path=DEFAULT_PATH, generations=3):
+    # Newest generation that still parses; a torn write falls back to the previous one
+    for candidate in generation_paths(path, generations):
+        try:
+            with open(candidate, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+def discard(path=DEFAULT_PATH, generations=3):
+    for candidate in generation_paths(path, generations) + [f"{path}.tmp"]:
+        try:
+            os.remove(candidate)
+        except OSError:
+            pass
+
+
+class AutosaveWorker:
+    def __init__(self, recorder, path=DEFAULT_PATH, debounce=2.0, max_delay=10.0, generations=3):
+        self.recorder = recorder
+        self.path = path
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.generations = generations
+        self.last_error = None
+        self._saved_revision = recorder.revision
+        self._changed = threading.Event()
+        self._stopping = False
+        self._flush_on_stop = True
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self._thread.start()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def notify(self):
+        self._changed.set()
+
+    def mark_saved(self):
+        self._saved_revision = self.recorder.revision
+
+    def stop(self, flush=True, timeout=None):
+        self._stopping = True
+        self._flush_on_stop = flush
+        self._changed.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            self._changed.wait()
+            if self._stopping:
+                break
+            first = time.monotonic()
+            # Debounce: wait for a quiet period, but never longer than max_delay
+            while not self._stopping:
+                self._changed.clear()
+                remaining = self.max_delay - (time.monotonic() - first)
+                if remaining <= 0 or not self._changed.wait(min(self.debounce, remaining)):
+                    break
+            self._changed.clear()
+            self.save_now()
+        if self._flush_on_stop:
+            self.save_now()
+
+    def save_now(self):
+        sections, delays_between, revision, tokens = self.recorder.frozen_snapshot()
+        if revision == self._saved_revision:
+            return
+        try:
+            # Only sections changed since the last save are re-serialized
+            text = self.recorder.pipeline.serialize(sections, tokens, delays_between, self.recorder.reference)
+            atomic_write_text(self.path, text, self.generations)
+            self._saved_revision = revision
+            self.last_error = None
+        except OSError as e:
+            self.last_error = e
@@ -0,0 +1,162 @@
+import threading
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:  # points are mapped in plain Python
+    np = None
+
+from step_records import compact_step
+
+# A macro recorded with a reference stores it as
+#   {"kind": "screen" | "window", "screen": [w, h], "rect": [left, top, w, h], "title": ...}
+# Coordinates stay in the recording's screen space; playback maps the
+# reference rect onto the matching rect of the machine it runs on.
+REFERENCE_KINDS = ("screen", "window")
+POINT_STEPS = ("mouse_press", "mouse_release", "mouse_click", "wait_pixel")
+VECTORIZE_MIN_POINTS = 256  # below this numpy's setup costs more than it saves
+
+
+class Transform(namedtuple("Transform", "sx sy tx ty")):
+    # x' = x * sx + tx, y' = y * sy + ty
+    __slots__ = ()
+
+    def apply(self, x, y):
+        return round(x * self.sx + self.tx), round(y * self.sy + self.ty)
+
+    def apply_rect(self, rect):
+        left, top, width, height = rect
+        x, y = self.apply(left, top)
+        return x, y, max(1, round(width * self.sx)), max(1, round(height * self.sy))
+
+
+IDENTITY = Transform(1.0, 1.0, 0.0, 0.0)
+
+
+def transform_between(source_rect, target_rect):
+    left, top, width, height = source_rect
+    t_left, t_top, t_width, t_height = target_rect
+    sx = t_width / width
+    sy = t_height / height
+    return Transform(sx, sy, t_left - left * sx, t_top - top * sy)
+
+
+def screen_reference(size):
+    width, height = (int(v) for v in size)
+    return {"kind": "screen", "screen": [width, height], "rect": [0, 0, width, height]}
+
+
+def window_reference(window, size):
+    width, height = (int(v) for v in size)
+    return {"kind": "window", "screen": [width, height],
+            "rect": [int(window.left), int(window.top), int(window.width), int(window.height)],
+            "title": getattr(window, "title", "")}
+
+
+def check_reference(reference):
+    # None means absolute coordinates; anything else must be a usable reference
+    if reference is None:
+        return None
+    try:
+        ok = (reference["kind"] in REFERENCE_KINDS and len(reference["screen"]) == 2
+              and len(reference["rect"]) == 4
+              and all(isinstance(v, (int, float)) for v in list(reference["screen"]) + list(reference["rect"]))
+              and min(reference["screen"]) > 0 and min(reference["rect"][2:]) > 0)
+    except (TypeError, KeyError):
+        ok = False
+    if not ok:
+        raise ValueError(f"invalid coordinate reference {reference!r}")
+    return reference
+
+
+def find_window(backend, title=None, point=None, active=True):
+    # Window lookups only exist where pyautogui has pygetwindow (Windows).
+    # A point picks the topmost window under it; the active window is the
+    # last resort unless active is False.
+    window = None
+    if title:
+        find = getattr(backend, "getWindowsWithTitle", None)
+        matches = find(title) if find else []
+        window = matches[0] if matches else None
+    if window is None and point is not None:
+        find = getattr(backend, "getWindowsAt", None)
+        matches = find(*point) if find else []
+        window = matches[0] if matches else None
+    if window is None and active:
+        get_active = getattr(backend, "getActiveWindow", None)
+        window = get_active() if get_active else None
+    if window is None or window.width <= 0 or window.height <= 0:
+        return None
+    return window
+
+
+def window_rect(window):
+    return (window.left, window.top, window.width, window.height)
+
+
+def map_points(points, transform):
+    if np is not None and len(points) >= VECTORIZE_MIN_POINTS:
+        xy = np.asarray(points, dtype=np.float64)
+        xy *= (transform.sx, transform.sy)
+        xy += (transform.tx, transform.ty)
+        return np.rint(xy).astype(np.int64).tolist()
+    sx, sy, tx, ty = transform
+    return [(round(x * sx + tx), round(y * sy + ty)) for x, y in points]
+
+
+def map_steps(steps, transform):
+    # Returns a new list; steps without coordinates are shared with the input
+    indices = []
+    points = []
+    for i, step in enumerate(steps):
+        t = step.get("type")
+        if t in POINT_STEPS:
+            indices.append(i)
+            points.append((step["x"], step["y"]))
+        elif t == "wait_image" and step.get("region"):
+            indices.append(i)
+            left, top, width, height = step["region"]
+            points.append((left, top))
+            indices.append(i)
+            points.append((left + width, top + height))
+    mapped = list(steps)
+    if not indices:
+        return mapped
+    new_points = map_points(points, transform)
+    k = 0
+    while k < len(indices):
+        i = indices[k]
+        step = steps[i]
+        x, y = new_points[k]
+        if step.get("type") == "wait_image":
+            right, bottom = new_points[k + 1]
+            mapped[i] = dict(step, region=[x, y, max(1, right - x), max(1, bottom - y)])
+            k += 2
+        else:
+            mapped[i] = compact_step(dict(step, x=x, y=y))
+            k += 1
+    return mapped
+
+
+class CoordinateMapper:
+    # Mapped step lists are cached per (section token, transform), so replaying
+    # the same macro on the same display maps each section once
+    def __init__(self):
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def map_sections(self, sections, tokens, transform):
+        if transform == IDENTITY:
+            return sections
+        with self._lock:
+            mapped = []
+            for section, token in zip(sections, tokens):
+                key = (token, transform)
+                steps = self._cache.get(key)
+                if steps is None:
+                    steps = self._cache[key] = map_steps(section["steps"], transform)
+                mapped.append({"name": section["name"], "steps": steps})
+            live = set(tokens)
+            for key in [k for k in self._cache if k[0] not in live or k[1] != transform]:
+                del self._cache[key]
+            return mapped
@@ -0,0 +1,141 @@
+from step_records import click_step, delay_step
+
+
+class InputFilter:
+    # Streaming cleanup between the listeners and a section's step list. Each
+    # push does O(1) work; at most one mouse press (and the delay after it) is
+    # held back until its release shows whether it was a click.
+    def __init__(self, enabled=True, merge_delays=True, collapse_clicks=True,
+                 click_max_ms=500, jitter_px=3, debounce_ms=30, trim_stop_click=True):
+        self.enabled = enabled
+        self.merge_delays = merge_delays
+        self.collapse_clicks = collapse_clicks
+        self.click_max_ms = click_max_ms
+        self.jitter_px = jitter_px
+        self.debounce_ms = debounce_ms
+        self.trim_stop_click = trim_stop_click
+        self.reset()
+
+    def reset(self):
+        self._pending = None  # held mouse press
+        self._pending_delay = 0
+        self._last_release = None  # (button, x, y) of the latest mouse release
+        self._since_release = 0
+        self._bouncing = None
+        self.dropped = 0
+
+    def push(self, step, steps):
+        # Returns the first index of steps that changed, or None
+        if not self.enabled:
+            steps.append(step)
+            return len(steps) - 1
+        t = step.get("type")
+        if t == "delay":
+            return self._push_delay(step, steps)
+        if t == "mouse_press":
+            return self._push_mouse_press(step, steps)
+        if t == "mouse_release":
+            return self._push_mouse_release(step, steps)
+        changed = self.flush(steps)
+        steps.append(step)
+        return _first(changed, len(steps) - 1)
+
+    def _push_delay(self, step, steps):
+        ms = step["delay"]
+        self._since_release += ms
+        if self._pending is not None:
+            self._pending_delay += ms
+            return None
+        return self._emit_delay(ms, steps)
+
+    def _emit_delay(self, ms, steps):
+        if not self.merge_delays:
+            steps.append(delay_step(ms))
+            return len(steps) - 1
+        if ms <= 0:
+            self.dropped += 1
+            return None
+        last = steps[-1] if steps else None
+        if last is not None and last.get("type") == "delay" and last.get("unit", "ms") == "ms":
+            steps[-1] = delay_step(last["delay"] + ms)
+            self.dropped += 1
+            return len(steps) - 1
+        steps.append(delay_step(ms))
+        return len(steps) - 1
+
+    def _near(self, a, b):
+        return abs(a["x"] - b["x"]) <= self.jitter_px and abs(a["y"] - b["y"]) <= self.jitter_px
+
+    def _push_mouse_press(self, step, steps):
+        changed = self.flush(steps)
+        last = self._last_release
+        if (last is not None and last["button"] == step["button"] and self._near(last, step)
+                and self._since_release < self.debounce_ms):
+            # Contact bounce: drop this press and the release that follows it
+            self._bouncing = step["button"]
+            self.dropped += 1
+            return changed
+        if self.collapse_clicks:
+            self._pending = step
+            self._pending_delay = 0
+            return changed
+        steps.append(step)
+        return _first(changed, len(steps) - 1)
+
+    def _push_mouse_release(self, step, steps):
+        if self._bouncing == step["button"]:
+            self._bouncing = None
+            self.dropped += 1
+            return None
+        self._last_release = step
+        self._since_release = 0
+        pending = self._pending
+        if (pending is not None and pending["button"] == step["button"] and self._near(pending, step)
+                and self._pending_delay <= self.click_max_ms):
+            self._pending = None
+            steps.append(click_step(pending["x"], pending["y"], pending["button"], self._pending_delay))
+            self.dropped += 2
+            return len(steps) - 1
+        changed = self.flush(steps)
+        steps.append(step)
+        return _first(changed, len(steps) - 1)
+
+    def flush(self, steps):
+        pending = self._pending
+        if pending is None:
+            return None
+        self._pending = None
+        steps.append(pending)
+        changed = len(steps) - 1
+        if self._pending_delay:
+            self._emit_delay(self._pending_delay, steps)
+        return changed
+
+    def finish(self, steps):
+        # End of recording: the last click is the one on the stop button
+        if not self.trim_stop_click:
+            return self.flush(steps)
+        if self._pending is not None:
+            # Stopped while the button was down: drop the press and the wait before it
+            self._pending = None
+            self.dropped += 1
+            if steps and steps[-1].get("type") == "delay":
+                steps.pop()
+            return len(steps)
+        if not steps or steps[-1].get("type") not in ("mouse_click", "mouse_press", "mouse_release"):
+            return None
+        last = steps.pop()
+        if last.get("type") == "mouse_release" and self.enabled:
+            if steps and steps[-1].get("type") == "delay":
+                steps.pop()
+            if steps and steps[-1].get("type") == "mouse_press" and steps[-1].get("button") == last.get("button"):
+                steps.pop()
+        if self.enabled and steps and steps[-1].get("type") == "delay":
+            steps.pop()
+        return len(steps)
+
+
+def _first(a, b):
+    if a is None:
+        return b
+    return min(a, b)
@@ -0,0 +1,99 @@
+import pyautogui
+from pynput import keyboard
+
+# Stored names are what the recorder writes into macros: the character for
+# printable keys, the pynput Key name for special keys and "<vk>" for keys
+# that only report a virtual-key code. The recorder skips keys that have no
+# backend name, so every macro it writes passes unknown_key_issues.
+SPECIAL_TO_BACKEND = {
+    "alt": "alt", "alt_l": "altleft", "alt_r": "altright", "alt_gr": "altright",
+    "backspace": "backspace", "caps_lock": "capslock",
+    "cmd": "winleft", "cmd_l": "winleft", "cmd_r": "winleft", "win": "winleft",
+    "ctrl": "ctrl", "ctrl_l": "ctrlleft", "ctrl_r": "ctrlright",
+    "delete": "delete", "down": "down", "end": "end", "enter": "enter", "esc": "esc",
+    "home": "home", "insert": "insert", "left": "left", "menu": "apps",
+    "num_lock": "numlock", "page_down": "pagedown", "page_up": "pageup", "pause": "pause",
+    "print_screen": "printscreen", "right": "right", "scroll_lock": "scrolllock",
+    "shift": "shift", "shift_l": "shiftleft", "shift_r": "shiftright",
+    "space": "space", "tab": "tab", "up": "up",
+    "media_play_pause": "playpause", "media_volume_mute": "volumemute",
+    "media_volume_down": "volumedown", "media_volume_up": "volumeup",
+    "media_previous": "prevtrack", "media_next": "nexttrack",
+}
+SPECIAL_TO_BACKEND.update({f"f{n}": f"f{n}" for n in range(1, 25)})
+
+# Windows virtual-key codes for keys pynput reports without a character
+# (digits and letters with Ctrl/Alt held, OEM punctuation on some layouts)
+VK_TO_BACKEND = {96 + n: f"num{n}" for n in range(10)}
+VK_TO_BACKEND.update({106: "multiply", 107: "add", 108: "separator", 109: "subtract", 110: "decimal", 111: "divide"})
+VK_TO_BACKEND.update({vk: chr(vk) for vk in range(48, 58)})
+VK_TO_BACKEND.update({vk: chr(vk + 32) for vk in range(65, 91)})
+VK_TO_BACKEND.update({186: ";", 187: "=", 188: ",", 189: "-", 190: ".", 191: "/", 192: "`",
+                      219: "[", 220: "\\", 221: "]", 222: "'"})
+VK_TO_BACKEND.update({112 + n: f"f{n + 1}" for n in range(24)})
+
+# Ctrl+letter arrives as a control character (Ctrl+A -> "\x01")
+CONTROL_CHARS = {chr(n): chr(n + 96) for n in range(1, 27)}
+
+
+def _build_backend_table():
+    known = set(pyautogui.KEYBOARD_KEYS)
+    table = {name: backend for name, backend in SPECIAL_TO_BACKEND.items() if backend in known}
+    for name in known:
+        if len(name) == 1:
+            table[name] = name
+            if name.isalpha():
+                table[name.upper()] = name.upper()
+    table.update((f"<{vk}>", backend) for vk, backend in VK_TO_BACKEND.items() if backend in known)
+    # "\t", "\n" and "\r" are keys in their own right and keep their entries
+    table.update((char, name) for char, name in CONTROL_CHARS.items() if char not in table)
+    return table
+
+
+BACKEND_KEYS = _build_backend_table()
+STORED_NAMES = frozenset(BACKEND_KEYS)
+PYNPUT_KEY_NAMES = {member: member.name for member in keyboard.Key}
+_keycode_names = {}
+
+
+def stored_name(key):
+    name = PYNPUT_KEY_NAMES.get(key)
+    if name is not None:
+        return name
+    name = _keycode_names.get(key)
+    if name is None:
+        char = getattr(key, "char", None)
+        if char is not None:
+            name = CONTROL_CHARS.get(char, char)
+        elif getattr(key, "vk", None) is not None:
+            name = f"<{key.vk}>"
+        else:
+            name = str(key).replace("Key.", "")
+        _keycode_names[key] = name
+    return name
+
+
+def backend_key(name):
+    return BACKEND_KEYS.get(name, name)
+
+
+def is_known(name):
+    return name in BACKEND_KEYS
+
+
+def unknown_key_issues(sections):
+    issues = []
+    for s_idx, section in enumerate(sections):
+        for a_idx, step in enumerate(section.get("steps", ())):
+            t = step.get("type")
+            if t == "press" or t == "release":
+                key = step.get("key")
+                if key not in BACKEND_KEYS:
+                    issues.append((s_idx, a_idx, f"unknown key {key!r}"))
+            elif t == "type_text":
+                text = step.get("text")
+                if isinstance(text, str):
+                    unknown = sorted({c for c in text if c not in BACKEND_KEYS})
+                    if unknown:
+                        issues.append((s_idx, a_idx, f"unknown characters {''.join(unknown)!r}"))
+    return issues
@@ -1,13 +1,22 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, simpledialog
 import threading
+import multiprocessing
 from macro_recorder import MacroRecorderCore
+import screen_waits
+from waiting import format_stats
+from macro_validator import MacroValidationError, format_issue
+from macro_timeline import format_progress
 from pynput import keyboard
 import os
-import json
+import autosave
+from macro_library import MacroLibrary
 
 STEP_WIDTH = 18
 STEP_HEIGHT = 2
+# Coordinate reference captured while recording (see coordinate_transform)
+COORDINATE_MODES = {"Absolute clicks": None, "Clicks relative to screen": "screen",
+                    "Clicks relative to window": "window"}
 
 
 class MacroEditorApp:
@@ -19,6 +28,7 @@ class MacroEditorApp:
         self.recorder = MacroRecorderCore()
         self.recorder.ui_callback = self._ui_callback
         self.recorder.playback_ui_callback = self._playback_highlight
+        self.recorder.progress_callback = self._playback_progress
 
         self.stop_event = None
         self.interrupt_listener = None
@@ -30,11 +40,7 @@ class MacroEditorApp:
         self.last_clicked = None  # Last clicked step for single-step movement
         self.last_recorded_step = None  # (section_idx, step_idx) of last recorded step
         self.pending_update = False
-
-        # Load temp macro if exists
-        temp_file = "temp_macro.json"
-        if os.path.exists(temp_file):
-            self.load_macro(temp_file)
+        self.library = None
 
         # Bind window close event
         self.root.protocol("WM_DELETE_WINDOW", self._on_closing)
@@ -47,17 +53,43 @@ class MacroEditorApp:
         self.record_button = tk.Button(top, text="Start Recording", command=self.toggle_recording)
         self.record_button.pack(side="left", padx=4)
         tk.Button(top, text="Play Macro", command=self.play_macro).pack(side="left", padx=4)
+        tk.Button(top, text="Play From Selected", command=self.play_from_selected).pack(side="left", padx=4)
+        tk.Button(top, text="Resume", command=self.resume_playback).pack(side="left", padx=4)
         tk.Button(top, text="Save", command=self.save_macro).pack(side="left", padx=4)
         tk.Button(top, text="Load", command=self.load_macro).pack(side="left", padx=4)
+        tk.Button(top, text="Library…", command=self.open_library).pack(side="left", padx=4)
         tk.Button(top, text="Clear All", command=self.clear_all).pack(side="left", padx=4)
+        tk.Button(top, text="Check", command=self.check_macro).pack(side="left", padx=4)
 
         self.quick_delay_var = tk.StringVar(value="250")
         tk.Label(top, text="Step Delay ms:").pack(side="left", padx=(16, 4))
         tk.Entry(top, textvariable=self.quick_delay_var, width=6).pack(side="left")
         tk.Button(top, text="Add Step Delay to Selected", command=self.add_quick_delay).pack(side="left", padx=4)
+        tk.Button(top, text="Add Wait…", command=self.add_wait).pack(side="left", padx=4)
+
+        self.coalesce_typing_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(top, text="Record typing as text", variable=self.coalesce_typing_var,
+                       command=lambda: setattr(self.recorder, "coalesce_typing", self.coalesce_typing_var.get())).pack(side="left", padx=8)
+
+        self.filter_input_var = tk.BooleanVar(value=self.recorder.input_filter.enabled)
+        tk.Checkbutton(top, text="Filter input noise", variable=self.filter_input_var,
+                       command=lambda: setattr(self.recorder.input_filter, "enabled", self.filter_input_var.get())).pack(side="left", padx=8)
+
+        self.coordinates_var = tk.StringVar(value="Absolute clicks")
+        tk.OptionMenu(top, self.coordinates_var, *COORDINATE_MODES,
+                      command=lambda mode: setattr(self.recorder, "relative_coordinates", COORDINATE_MODES[mode])).pack(side="left", padx=8)
+        # Empty: the window under the first recorded click
+        self.window_title_var = tk.StringVar(value="")
+        tk.Label(top, text="Window title:").pack(side="left")
+        tk.Entry(top, textvariable=self.window_title_var, width=16).pack(side="left", padx=(0, 8))
 
         self.auto_minimize_var = tk.BooleanVar(value=False)
         tk.Checkbutton(top, text="Auto-minimize when recording", variable=self.auto_minimize_var).pack(side="left", padx=8)
+        self.validate_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(top, text="Validate before load/play", variable=self.validate_var).pack(side="left", padx=8)
+
+        self.progress_var = tk.StringVar(value="")
+        tk.Label(top, textvariable=self.progress_var, anchor="w").pack(side="left", padx=8)
 
         # ===== Scrollable area (both directions) =====
         outer = tk.Frame(root)
@@ -96,22 +128,38 @@ class MacroEditorApp:
         self.root.bind("<FocusIn>", self._on_focus_in)
         self.root.bind("<Map>", self._on_map)
 
+        # Autosave starts after recovery so the recovered macro is not re-saved as empty
+        self.autosave = autosave.AutosaveWorker(self.recorder)
+        self.recorder.change_callback = self.autosave.notify
+        threading.Thread(target=self._recover_autosave, daemon=True).start()
+
+    def _recover_autosave(self):
+        data = autosave.recover(self.autosave.path, self.autosave.generations)
+        self.root.after(0, lambda: self._apply_recovered(data))
+
+    def _apply_recovered(self, data):
+        if data:
+            try:
+                # The session's own state is restored even if it has unknown keys
+                self.recorder.load_data(data, check_key_names=False)
+            except Exception:
+                data = None
+        if data:
+            self.last_recorded_step = None
+            self.selected_steps.clear()
+            self.active_section_index = 0
+            self.render_sections()
+        self.autosave.mark_saved()
+        self.autosave.start()
+
     def _on_closing(self):
         self.save_temp_macro()
         self.root.destroy()
 
     def save_temp_macro(self):
-        temp_file = "temp_macro.json"
-        with self.recorder._lock:
-            data = {
-                "sections": self.recorder.sections,
-                "delays_between": self.recorder.delays_between
-            }
-        try:
-            with open(temp_file, "w") as f:
-                json.dump(data, f)
-        except Exception:
-            pass  # Silently fail to avoid interrupting close
+        # Before recovery finishes there is nothing newer than the files on disk
+        if self.autosave.is_running():
+            self.autosave.stop(flush=True)
 
     def _ui_callback(self):
         if self._is_visible():
@@ -320,10 +368,19 @@ class MacroEditorApp:
             return f"{step['key']} (pressed)"
         if t == "release":
             return f"{step['key']} (released)"
+        if t == "type_text":
+            text = step["text"] if len(step["text"]) <= 16 else step["text"][:15] + "…"
+            return f"Type \"{text}\""
         if t == "mouse_press":
             return f"Mouse {step['button']} press @ ({step['x']}, {step['y']})"
         if t == "mouse_release":
             return f"Mouse {step['button']} release @ ({step['x']}, {step['y']})"
+        if t == "mouse_click":
+            return f"Mouse {step['button']} click @ ({step['x']}, {step['y']})"
+        if t == "wait_pixel":
+            return f"Wait pixel ({step['x']}, {step['y']}) ≤{step.get('timeout', screen_waits.DEFAULT_TIMEOUT_MS)} ms"
+        if t == "wait_image":
+            return f"Wait {os.path.basename(step['template'])} ≤{step.get('timeout', screen_waits.DEFAULT_TIMEOUT_MS)} ms"
         return "Unknown"
 
     def _playback_highlight(self, sec_idx, step_idx, active):
@@ -349,6 +406,10 @@ class MacroEditorApp:
                 self._scroll_to_widget(widget)
         self.root.after(0, do_highlight)
 
+    def _playback_progress(self, info):
+        text = format_progress(info)
+        self.root.after(0, lambda: self.progress_var.set(text))
+
     def clear_selection(self):
         for (si, sti), lbl in self.selected_steps.items():
             if (si, sti) == self.last_recorded_step:
@@ -526,6 +587,49 @@ class MacroEditorApp:
             return
         self.recorder.add_delay_step(self.active_section_index, ms)
 
+    def add_wait(self):
+        if self.active_section_index is None:
+            messagebox.showerror("Error", "Select a section first.")
+            return
+        kind = simpledialog.askstring("Add Wait", "Wait for 'pixel' or 'image':", initialvalue="pixel")
+        if not kind:
+            return
+        kind = kind.strip().lower()
+        if kind == "pixel":
+            pos = simpledialog.askstring("Pixel Wait", "Pixel position x,y (current color is captured):")
+            if not pos:
+                return
+            try:
+                x, y = (int(v) for v in pos.split(","))
+                step = {"type": "wait_pixel", "x": x, "y": y, "color": list(screen_waits.read_pixel(x, y)), "tolerance": 8}
+            except Exception:
+                messagebox.showerror("Error", "Enter a valid position (x,y).")
+                return
+        elif kind == "image":
+            template = filedialog.askopenfilename(filetypes=[("Images", "*.png *.bmp *.jpg")])
+            if not template:
+                return
+            step = {"type": "wait_image", "template": template, "region": None,
+                    "confidence": screen_waits.DEFAULT_CONFIDENCE, "scale": screen_waits.DEFAULT_SCALE}
+            region = simpledialog.askstring("Image Wait", "Search region left,top,width,height (blank for full screen):")
+            if region:
+                try:
+                    step["region"] = [int(v) for v in region.split(",")]
+                    if len(step["region"]) != 4:
+                        raise ValueError
+                except ValueError:
+                    messagebox.showerror("Error", "Enter a valid region (left,top,width,height).")
+                    return
+        else:
+            messagebox.showerror("Error", "Choose 'pixel' or 'image'.")
+            return
+        timeout = simpledialog.askinteger("Add Wait", "Timeout (ms):", initialvalue=screen_waits.DEFAULT_TIMEOUT_MS, minvalue=0)
+        if timeout is None:
+            return
+        step["timeout"] = timeout
+        step["poll"] = self.recorder.wait_poll_ms
+        self.recorder.add_wait_step(self.active_section_index, step)
+
     def toggle_recording(self):
         if self.recorder.recording:
             sections = self.recorder.snapshot_sections()
@@ -534,6 +638,9 @@ class MacroEditorApp:
                 self.last_recorded_step = (self.active_section_index, len(steps) - 1) if steps else None
             self.recorder.stop_recording()
             self.record_button.config(text="Start Recording", bg="SystemButtonFace")
+            if self.recorder.skipped_keys:
+                names = ", ".join(sorted(repr(k) for k in self.recorder.skipped_keys))
+                messagebox.showwarning("Recording", f"Keys that cannot be played back were not recorded: {names}")
             if self._is_visible():
                 self.render_sections()
             else:
@@ -543,12 +650,26 @@ class MacroEditorApp:
                 messagebox.showerror("Error", "Select a section first.")
                 return
             self.last_recorded_step = None
+            self.recorder.reference_window_title = self.window_title_var.get().strip() or None
             self.recorder.start_recording(self.active_section_index)
             self.record_button.config(text="Stop Recording", bg="red")
             if self.auto_minimize_var.get():
                 self.root.iconify()
 
-    def play_macro(self):
+    def play_from_selected(self):
+        if self.last_clicked is None:
+            messagebox.showerror("Error", "Select a step first.")
+            return
+        self.play_macro(self.last_clicked)
+
+    def resume_playback(self):
+        checkpoint = self.recorder.checkpoint
+        if checkpoint is None:
+            messagebox.showinfo("Resume", "No interrupted playback to resume.")
+            return
+        self.play_macro((checkpoint["section"], checkpoint["step"], checkpoint.get("char", 0)))
+
+    def play_macro(self, start=(0, 0)):
         self.stop_event = threading.Event()
         self.pressed = set()
 
@@ -563,28 +684,63 @@ class MacroEditorApp:
 
         self.interrupt_listener = keyboard.Listener(on_press=on_press_key, on_release=on_release_key)
         self.interrupt_listener.start()
-        threading.Thread(target=self._run_playback, daemon=True).start()
+        threading.Thread(target=self._run_playback, args=start, daemon=True).start()
 
-    def _run_playback(self):
-        self.recorder.play_all(self.stop_event)
+    def _run_playback(self, section_idx=0, step_idx=0, char_idx=0):
+        try:
+            self.recorder.play_from(section_idx, step_idx, self.stop_event, validate=self.validate_var.get(),
+                                    char_index=char_idx)
+        except MacroValidationError as e:
+            if self.interrupt_listener:
+                self.interrupt_listener.stop()
+                self.interrupt_listener = None
+            self._show_validation_errors("Playback", e.report)
+            return
         self.finish_playback()
 
+    def _show_validation_errors(self, title, report):
+        lines = [format_issue(i) for i in report["issues"] if i["severity"] == "error"][:15]
+        more = report["error_count"] - len(lines)
+        if more > 0:
+            lines.append(f"…and {more} more")
+        messagebox.showerror(title, "Macro is invalid:\n" + "\n".join(lines))
+
+    def check_macro(self):
+        report = self.recorder.validate()
+        summary = f"Total duration: {report['duration_ms'] / 1000:.1f} s"
+        if report["max_wait_ms"]:
+            summary += f" (+ up to {report['max_wait_ms'] / 1000:.1f} s of waits)"
+        for idx, sec in enumerate(report["sections"]):
+            held = ", ".join(str(k) for k in sec["held_keys"] + sec["held_buttons"])
+            summary += f"\nSection {idx + 1}: {sec['presses']} presses, {sec['releases']} releases"
+            if held:
+                summary += f", held after: {held}"
+        if report["issues"]:
+            summary += "\n\n" + "\n".join(f"[{i['severity']}] {format_issue(i)}" for i in report["issues"][:15])
+            if len(report["issues"]) > 15:
+                summary += f"\n…and {len(report['issues']) - 15} more"
+        if report["ok"]:
+            messagebox.showinfo("Check Macro", summary)
+        else:
+            messagebox.showerror("Check Macro", summary)
+
     def finish_playback(self):
         if self.interrupt_listener:
             self.interrupt_listener.stop()
             self.interrupt_listener = None
-        messagebox.showinfo("Playback", "Macro finished." if not self.stop_event.is_set() else "Macro interrupted.")
+        message = "Macro finished." if not self.stop_event.is_set() else "Macro interrupted."
+        checkpoint = self.recorder.checkpoint
+        if checkpoint is not None:
+            message += f" Resume will continue at section {checkpoint['section'] + 1}, step {checkpoint['step'] + 1}."
+        if self.recorder.last_run_stats:
+            message += "\n" + format_stats(self.recorder.last_run_stats)
+        messagebox.showinfo("Playback", message)
 
     def clear_all(self):
         self.recorder.clear_all()
         self.last_recorded_step = None
         self.selected_steps.clear()
-        temp_file = "temp_macro.json"
-        if os.path.exists(temp_file):
-            try:
-                os.remove(temp_file)
-            except Exception:
-                pass
+        autosave.discard(self.autosave.path, self.autosave.generations)
         if self._is_visible():
             self.render_sections()
         else:
@@ -597,11 +753,90 @@ class MacroEditorApp:
             self.recorder.save_macro(file)
             messagebox.showinfo("Save", "Macro saved.")
 
+    def open_library(self):
+        if self.library is None:
+            self.library = MacroLibrary()
+        self.library.refresh()
+
+        win = tk.Toplevel(self.root)
+        win.title("Macro Library")
+        win.geometry("560x420")
+
+        search_var = tk.StringVar()
+        search_row = tk.Frame(win)
+        search_row.pack(fill="x", padx=6, pady=6)
+        tk.Label(search_row, text="Search:").pack(side="left")
+        tk.Entry(search_row, textvariable=search_var).pack(side="left", fill="x", expand=True, padx=4)
+
+        listbox = tk.Listbox(win, activestyle="none")
+        listbox.pack(fill="both", expand=True, padx=6)
+        shown = []
+
+        def refresh_list(*_args):
+            shown[:] = self.library.search(search_var.get())
+            listbox.delete(0, "end")
+            for e in shown:
+                tags = f"  [{', '.join(e['tags'])}]" if e["tags"] else ""
+                listbox.insert("end", f"{e['name']} — {e['step_count']} steps, {e['duration_ms'] / 1000:.1f} s{tags}")
+
+        def selected_entry():
+            sel = listbox.curselection()
+            return shown[sel[0]] if sel else None
+
+        def load_selected(_event=None):
+            entry = selected_entry()
+            if entry is None:
+                return
+            try:
+                data = self.library.load(entry["name"])
+                self.recorder.load_data(data, validate=self.validate_var.get(), check_key_names=False)
+            except MacroValidationError as e:
+                self._show_validation_errors("Load", e.report)
+                return
+            self.last_recorded_step = None
+            self.selected_steps.clear()
+            self.active_section_index = 0
+            self.render_sections()
+
+        def add_current():
+            name = simpledialog.askstring("Add to Library", "Macro name:", parent=win)
+            if not name:
+                return
+            tags = simpledialog.askstring("Add to Library", "Tags (comma separated):", parent=win) or ""
+            data = {"sections": self.recorder.snapshot_sections(), "delays_between": self.recorder.snapshot_between_delays()}
+            if self.recorder.reference is not None:
+                data["reference"] = self.recorder.reference
+            self.library.add(name.strip(), data, [t.strip() for t in tags.split(",") if t.strip()])
+            refresh_list()
+
+        def edit_tags():
+            entry = selected_entry()
+            if entry is None:
+                return
+            tags = simpledialog.askstring("Tags", "Tags (comma separated):", initialvalue=", ".join(entry["tags"]), parent=win)
+            if tags is not None:
+                self.library.set_tags(entry["name"], [t.strip() for t in tags.split(",") if t.strip()])
+                refresh_list()
+
+        buttons = tk.Frame(win)
+        buttons.pack(fill="x", padx=6, pady=6)
+        tk.Button(buttons, text="Load", command=load_selected).pack(side="left", padx=4)
+        tk.Button(buttons, text="Add Current…", command=add_current).pack(side="left", padx=4)
+        tk.Button(buttons, text="Tags…", command=edit_tags).pack(side="left", padx=4)
+
+        search_var.trace_add("write", refresh_list)
+        listbox.bind("<Double-Button-1>", load_selected)
+        refresh_list()
+
     def load_macro(self, file=None):
         if file is None:
             file = filedialog.askopenfilename(filetypes=[("JSON", "*.json")])
         if file:
-            self.recorder.load_macro(file)
+            try:
+                self.recorder.load_macro(file, validate=self.validate_var.get())
+            except MacroValidationError as e:
+                self._show_validation_errors("Load", e.report)
+                return
             self.last_recorded_step = None
             self.selected_steps.clear()
             if self._is_visible():
@@ -611,6 +846,7 @@ class MacroEditorApp:
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = MacroEditorApp(root)
     root.mainloop()
\ No newline at end of file
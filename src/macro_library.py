@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+from autosave import atomic_write_json
+from macro_steps import step_duration_ms
+from macro_validator import check_keys
+from step_records import compact_step
+
+DEFAULT_DIRECTORY = "macro_library"
+INDEX_FILE = "index.json"
+INDEX_VERSION = 1
+
+
+def split_macro(data):
+    if isinstance(data, list):
+        return data, [0] * max(0, len(data) - 1)
+    sections = data.get("sections", [])
+    return sections, data.get("delays_between", [0] * max(0, len(sections) - 1))
+
+
+def describe_macro(data):
+    sections, gaps = split_macro(data)
+    steps = sum(len(s.get("steps", ())) for s in sections)
+    duration = sum(step_duration_ms(step) for s in sections for step in s.get("steps", ()))
+    duration += sum(g for g in gaps[:max(0, len(sections) - 1)] if isinstance(g, (int, float)) and g > 0)
+    return {"sections": len(sections), "step_count": steps, "duration_ms": duration}
+
+
+class MacroLibrary:
+    def __init__(self, directory=DEFAULT_DIRECTORY, cache_size=8):
+        self.directory = directory
+        self.cache_size = cache_size
+        self._index = {}
+        self._cache = OrderedDict()  # (name, hash) -> compiled macro
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    @property
+    def index_path(self):
+        return os.path.join(self.directory, INDEX_FILE)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name + ".json")
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r") as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                self._index = data.get("macros", {})
+        except (OSError, ValueError, AttributeError):
+            self._index = {}
+
+    def _save_index(self):
+        atomic_write_json(self.index_path, {"version": INDEX_VERSION, "macros": self._index})
+
+    def refresh(self):
+        # Only files whose size or mtime changed since the last scan are parsed
+        seen = set()
+        changed = False
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".json") or filename == INDEX_FILE:
+                continue
+            name = filename[:-5]
+            seen.add(name)
+            stat = os.stat(self._path(name))
+            if self._is_current(name, stat):
+                continue
+            try:
+                self._index_file(name, stat)
+            except (OSError, ValueError, AttributeError):
+                continue
+            changed = True
+        for name in set(self._index) - seen:
+            del self._index[name]
+            changed = True
+        if changed:
+            self._save_index()
+
+    def _is_current(self, name, stat):
+        entry = self._index.get(name)
+        return entry is not None and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime
+
+    def _index_file(self, name, stat):
+        # Returns the file's bytes so a caller about to parse them need not read it again
+        with open(self._path(name), "rb") as f:
+            raw = f.read()
+        meta = describe_macro(json.loads(raw))
+        entry = self._index.get(name)
+        self._index[name] = dict(meta, name=name, size=stat.st_size, mtime=stat.st_mtime,
+                                 hash=hashlib.sha256(raw).hexdigest(),
+                                 tags=entry.get("tags", []) if entry else [])
+        return raw
+
+    def entries(self):
+        return sorted(self._index.values(), key=lambda e: e["name"].lower())
+
+    def search(self, text="", tags=()):
+        text = text.strip().lower()
+        tags = {t.lower() for t in tags}
+        return [e for e in self.entries()
+                if (not text or text in e["name"].lower() or any(text in t.lower() for t in e["tags"]))
+                and tags <= {t.lower() for t in e["tags"]}]
+
+    def load(self, name):
+        # The file may have been added or rewritten since the last refresh()
+        try:
+            stat = os.stat(self._path(name))
+        except FileNotFoundError:
+            if self._index.pop(name, None) is not None:
+                self._save_index()
+            raise KeyError(name)
+        raw = None
+        if not self._is_current(name, stat):
+            raw = self._index_file(name, stat)
+            self._save_index()
+            self._cache = OrderedDict((k, v) for k, v in self._cache.items() if k[0] != name)
+        key = (name, self._index[name]["hash"])
+        compiled = self._cache.get(key)
+        if compiled is None:
+            if raw is None:
+                with open(self._path(name), "rb") as f:
+                    raw = f.read()
+            data = json.loads(raw, object_hook=compact_step)
+            sections, gaps = split_macro(data)
+            check_keys(sections)
+            compiled = {"sections": sections, "delays_between": gaps,
+                        "reference": data.get("reference") if isinstance(data, dict) else None}
+            self._cache[key] = compiled
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        # Callers get their own section lists; step dicts are never mutated in place
+        return {
+            "sections": [{"name": s["name"], "steps": list(s["steps"])} for s in compiled["sections"]],
+            "delays_between": list(compiled["delays_between"]),
+            "reference": compiled["reference"],
+        }
+
+    def add(self, name, data, tags=()):
+        path = self._path(name)
+        atomic_write_json(path, data)
+        with open(path, "rb") as f:
+            raw = f.read()
+        stat = os.stat(path)
+        self._index[name] = dict(describe_macro(data), name=name, size=stat.st_size, mtime=stat.st_mtime,
+                                 hash=hashlib.sha256(raw).hexdigest(), tags=sorted(set(tags)))
+        self._save_index()
+
+    def set_tags(self, name, tags):
+        self._index[name]["tags"] = sorted(set(tags))
+        self._save_index()
+
+    def remove(self, name):
+        try:
+            os.remove(self._path(name))
+        except OSError:
+            pass
+        self._index.pop(name, None)
+        self._cache = OrderedDict((k, v) for k, v in self._cache.items() if k[0] != name)
+        self._save_index()
@@ -3,6 +3,23 @@ from pynput import keyboard, mouse
 import pyautogui
 import json
 import threading
+import itertools
+import screen_waits
+from waiting import Waiter, RunStats
+from macro_steps import delay_seconds, WAIT_STEPS
+from macro_validator import check_macro, check_keys
+import key_mapping
+from section_pipeline import SectionPipeline
+from input_filter import InputFilter
+from step_records import compact_step, compact_steps, delay_step, key_step, mouse_step
+import coordinate_transform
+from coordinate_transform import CoordinateMapper, IDENTITY, transform_between
+from macro_timeline import MacroTimeline, ProgressTracker, apply_held_effect
+
+
+TYPING_CHARS = {"space": " "}
+MAX_TYPING_RUN = 256
+TYPE_TEXT_CHUNK_MS = 250  # batched type_text checks for a stop this often
 
 
 class MacroRecorderCore:
@@ -14,15 +31,59 @@ class MacroRecorderCore:
         self.mouse_listener = None
         self.last_time = None
         self.pressed_keys = set()
+        self.skipped_keys = set()  # keys left out of the last recording, see _on_press
         self.active_section_index = None
         self.ui_callback = None
         self.playback_ui_callback = None
+        self.progress_callback = None
         self._lock = threading.Lock()
         self._last_ui_update = 0
         self._ui_update_interval = 0.1  # 100ms
+        self.wait_poll_ms = screen_waits.DEFAULT_POLL_MS
+        self.last_run_stats = None
+        self.timeline = MacroTimeline()
+        self.checkpoint = None
+        self.revision = 0
+        self.change_callback = None
+        self._frozen_steps = {}
+        # One token per section, replaced whenever the section changes
+        self._tokens = itertools.count(1)
+        self.section_tokens = []
+        self.pipeline = SectionPipeline()
+        self.input_filter = InputFilter()
+        self.coalesce_typing = False
+        self.type_text_tolerance_ms = 15
+        self._typing = None
+        # Sources of time, input and output; tests swap these for fakes
+        self.clock = time.time
+        self.playback_clock = time.perf_counter
+        self.keyboard_listener_factory = keyboard.Listener
+        self.mouse_listener_factory = mouse.Listener
+        self.backend = pyautogui
+        self.waiter_factory = Waiter
+        # Coordinate reference of the macro (see coordinate_transform); None keeps
+        # clicks absolute. relative_coordinates ("screen" or "window") captures one
+        # when recording starts, replay_target overrides the rect played onto.
+        # A window reference is taken from reference_window_title if set, else
+        # from the window under the first recorded click.
+        self.reference = None
+        self.relative_coordinates = None
+        self.reference_window_title = None
+        self.replay_target = None
+        self.coordinates = CoordinateMapper()
+        self._record_transform = IDENTITY
+        self._window_pending = False
 
     def _notify_ui(self):
-        current_time = time.time()
+        with self._lock:
+            self.revision += 1
+        cb = self.change_callback
+        if cb:
+            try:
+                cb()
+            except Exception:
+                pass
+        current_time = self.clock()
         if current_time - self._last_ui_update >= self._ui_update_interval:
             cb = self.ui_callback
             if cb:
@@ -32,6 +93,14 @@ class MacroRecorderCore:
                 except Exception:
                     pass
 
+    def _progress_notify(self, info):
+        cb = self.progress_callback
+        if cb:
+            try:
+                cb(info)
+            except Exception:
+                pass
+
     def _playback_notify(self, section_idx, step_idx, active):
         cb = self.playback_ui_callback
         if cb:
@@ -54,12 +123,16 @@ class MacroRecorderCore:
             self.recording = True
             self.active_section_index = section_index
             self.pressed_keys.clear()
-            self.last_time = time.time() * 1000
+            self.skipped_keys.clear()
+            self._typing = None
+            self.input_filter.reset()
+            self._start_reference_no_lock()
+            self.last_time = self.clock() * 1000
 
             try:
-                self.listener = keyboard.Listener(on_press=self._on_press, on_release=self._on_release)
+                self.listener = self.keyboard_listener_factory(on_press=self._on_press, on_release=self._on_release)
                 self.listener.start()
-                self.mouse_listener = mouse.Listener(on_click=self._on_mouse_click)
+                self.mouse_listener = self.mouse_listener_factory(on_click=self._on_mouse_click)
                 self.mouse_listener.start()
             except Exception as e:
                 self.recording = False
@@ -68,6 +141,52 @@ class MacroRecorderCore:
 
         self._notify_ui()
 
+    def _start_reference_no_lock(self):
+        # Clicks are stored in the macro's reference space, so recording more
+        # steps on another display keeps them consistent with the old ones
+        self._record_transform = IDENTITY
+        self._window_pending = False
+        if self.reference is None:
+            if self.relative_coordinates == "window":
+                # Recording is started from the editor, so the active window now is the editor
+                # itself; without a title the window is picked at the first click instead
+                title = self.reference_window_title
+                self._window_pending = not (title and self._capture_window_no_lock(title))
+            elif self.relative_coordinates:
+                self.reference = coordinate_transform.screen_reference(self.backend.size())
+        else:
+            transform = transform_between(self._current_rect(self.reference), self.reference["rect"])
+            self._record_transform = IDENTITY if transform == IDENTITY else transform
+
+    def _capture_window_no_lock(self, title=None, point=None):
+        window = coordinate_transform.find_window(self.backend, title, point, active=point is not None)
+        if window is None:
+            return False
+        self.reference = coordinate_transform.window_reference(window, self.backend.size())
+        return True
+
+    def _current_rect(self, reference):
+        if self.replay_target is not None:
+            return tuple(self.replay_target)
+        if reference["kind"] == "window":
+            # The active window during replay is usually the editor, so only the title counts
+            window = coordinate_transform.find_window(self.backend, reference.get("title"), active=False)
+            if window is not None:
+                return coordinate_transform.window_rect(window)
+        width, height = self.backend.size()
+        if reference["kind"] == "window":
+            # Window gone: keep its place relative to the screen
+            return transform_between([0, 0] + list(reference["screen"]), (0, 0, width, height)).apply_rect(
+                reference["rect"])
+        return (0, 0, width, height)
+
+    def replay_transform(self, reference=None):
+        reference = reference or self.reference
+        if reference is None:
+            return IDENTITY
+        transform = transform_between(reference["rect"], self._current_rect(reference))
+        return IDENTITY if transform == IDENTITY else transform
+
     def stop_recording(self):
         with self._lock:
             if not self.recording:
@@ -79,33 +198,38 @@ class MacroRecorderCore:
             if self.mouse_listener:
                 self.mouse_listener.stop()
                 self.mouse_listener = None
+            self._close_typing_run_no_lock()
+            self._window_pending = False
             if self.active_section_index is not None:
-                steps = self.sections[self.active_section_index]["steps"]
-                if steps and steps[-1].get("type") in ("mouse_press", "mouse_release"):
-                    steps.pop()
+                changed = self.input_filter.finish(self._mutable_steps(self.active_section_index))
+                if changed is not None:
+                    self._invalidate_no_lock(self.active_section_index, changed)
             self.pressed_keys.clear()
             self.active_section_index = None
         self._notify_ui()
 
     def _normalize_key(self, key):
-        try:
-            return key.char
-        except AttributeError:
-            return str(key).replace("Key.", "")
+        return key_mapping.stored_name(key)
 
     def _on_press(self, key):
         with self._lock:
             if self.active_section_index is None:
                 return
-            current_time = time.time() * 1000
+            current_time = self.clock() * 1000
             k = self._normalize_key(key)
+            if not key_mapping.is_known(k):
+                # Playback could not press it (e.g. "é" or an unmapped vk), and load would reject it
+                self.skipped_keys.add(k)
+                return
 
             if k not in self.pressed_keys:
+                if not self._typing_press_no_lock(k, current_time):
+                    self._close_typing_run_no_lock()
+                    if self.last_time is not None:
+                        delay = round(current_time - self.last_time)
+                        self._add_step_no_lock(delay_step(delay))
+                    self._add_step_no_lock(key_step("press", k))
                 self.pressed_keys.add(k)
-                if self.last_time is not None:
-                    delay = int(current_time - self.last_time)
-                    self._add_step_no_lock({"type": "delay", "delay": delay, "unit": "ms"})
-                self._add_step_no_lock({"type": "press", "key": k})
                 self.last_time = current_time
         self._notify_ui()
 
@@ -113,23 +237,94 @@ class MacroRecorderCore:
         with self._lock:
             if self.active_section_index is None:
                 return
-            current_time = time.time() * 1000
+            current_time = self.clock() * 1000
             k = self._normalize_key(key)
+            if not key_mapping.is_known(k):
+                self.skipped_keys.add(k)
+                return
 
             if k in self.pressed_keys:
                 self.pressed_keys.remove(k)
-                if self.last_time is not None:
-                    delay = int(current_time - self.last_time)
-                    self._add_step_no_lock({"type": "delay", "delay": delay, "unit": "ms"})
-                self._add_step_no_lock({"type": "release", "key": k})
+                if not self._typing_release_no_lock(k, current_time):
+                    self._close_typing_run_no_lock()
+                    if self.last_time is not None:
+                        delay = round(current_time - self.last_time)
+                        self._add_step_no_lock(delay_step(delay))
+                    self._add_step_no_lock(key_step("release", k))
                 self.last_time = current_time
         self._notify_ui()
 
+    def _typing_press_no_lock(self, k, current_time):
+        # A plain character pressed with nothing else held joins (or starts) the
+        # open type_text step; timing holds [hold, gap, hold, gap, ..., hold] in ms
+        char = TYPING_CHARS.get(k, k)
+        if not (self.coalesce_typing and self.active_section_index is not None and not self.pressed_keys
+                and isinstance(char, str) and len(char) == 1 and char.isprintable()):
+            return False
+        run = self._typing
+        steps = self.sections[self.active_section_index]["steps"]
+        if (run is not None and run["section"] == self.active_section_index and steps
+                and steps[-1] is run["step"] and len(run["text"]) < MAX_TYPING_RUN):
+            run["timing"].append(round(current_time - self.last_time))
+        else:
+            self._close_typing_run_no_lock()
+            self._flush_input_filter_no_lock()
+            if self.last_time is not None:
+                delay = round(current_time - self.last_time)
+                self._add_step_no_lock(delay_step(delay))
+            run = self._typing = {"section": self.active_section_index, "text": [], "timing": [], "step": None}
+        run["text"].append(char)
+        run["pending"] = k
+        self._publish_typing_run_no_lock(run)
+        return True
+
+    def _typing_release_no_lock(self, k, current_time):
+        run = self._typing
+        if run is None or run.get("pending") != k:
+            return False
+        run["timing"].append(round(current_time - self.last_time))
+        run["pending"] = None
+        self._publish_typing_run_no_lock(run)
+        return True
+
+    def _publish_typing_run_no_lock(self, run):
+        # Steps are replaced rather than mutated so frozen snapshots stay consistent
+        step = {"type": "type_text", "text": "".join(run["text"]), "timing": list(run["timing"])}
+        steps = self._mutable_steps(run["section"])
+        if run["step"] is not None and steps and steps[-1] is run["step"]:
+            steps[-1] = step
+        else:
+            steps.append(step)
+        self._invalidate_no_lock(run["section"], len(steps) - 1)
+        run["step"] = step
+
+    def _close_typing_run_no_lock(self):
+        run = self._typing
+        self._typing = None
+        if run is None or run.get("pending") is None:
+            return
+        steps = self._mutable_steps(run["section"])
+        if not (steps and steps[-1] is run["step"]):
+            return
+        # The last character is still down, so hand it back as a plain press step
+        k = run["pending"]
+        run["pending"] = None
+        run["text"].pop()
+        gap = run["timing"].pop() if run["timing"] else None
+        idx = len(steps) - 1
+        if run["text"]:
+            self._publish_typing_run_no_lock(run)
+            steps.append(delay_step(gap))
+            steps.append(key_step("press", k))
+        else:
+            steps[-1] = key_step("press", k)
+        self._invalidate_no_lock(run["section"], idx)
+
     def _on_mouse_click(self, x, y, button, pressed):
         with self._lock:
             if not self.recording or self.active_section_index is None:
                 return
-            current_time = time.time() * 1000
+            current_time = self.clock() * 1000
             button_map = {
                 mouse.Button.left: 'left',
                 mouse.Button.right: 'right',
@@ -139,17 +334,29 @@ class MacroRecorderCore:
             if button_str is None:
                 return
             action_type = "mouse_press" if pressed else "mouse_release"
+            if self._window_pending:
+                # Anchor to the window that was clicked; with none found the screen is the reference
+                self._window_pending = False
+                title = self.reference_window_title
+                if not ((title and self._capture_window_no_lock(title))
+                        or self._capture_window_no_lock(point=(x, y))):
+                    self.reference = coordinate_transform.screen_reference(self.backend.size())
+            if self._record_transform is not IDENTITY:
+                x, y = self._record_transform.apply(x, y)
+            self._close_typing_run_no_lock()
             if self.last_time is not None:
-                delay = int(current_time - self.last_time)
+                delay = round(current_time - self.last_time)
                 if delay > 0:
-                    self._add_step_no_lock({"type": "delay", "delay": delay, "unit": "ms"})
-            self._add_step_no_lock({"type": action_type, "x": int(x), "y": int(y), "button": button_str})
+                    self._add_step_no_lock(delay_step(delay))
+            self._add_step_no_lock(mouse_step(action_type, int(x), int(y), button_str))
             self.last_time = current_time
         self._notify_ui()
 
     def add_section(self, name="New Section"):
         with self._lock:
             self.sections.append({"name": name, "steps": []})
+            self.section_tokens.append(next(self._tokens))
+            self.timeline.insert_section(len(self.sections) - 1)
             self._ensure_gap_count()
             idx = len(self.sections) - 1
         self._notify_ui()
@@ -159,6 +366,7 @@ class MacroRecorderCore:
         with self._lock:
             if 0 <= idx < len(self.sections):
                 self.sections[idx]["name"] = name
+                self.section_tokens[idx] = next(self._tokens)
         self._notify_ui()
 
     def delete_section(self, idx):
@@ -169,6 +377,9 @@ class MacroRecorderCore:
             if n == 0:
                 return
 
+            self.timeline.remove_section(idx)
+            self._drop_checkpoint_no_lock(idx)
+            del self.section_tokens[idx]
             if n == 1:
                 self.sections.pop(idx)
                 self.delays_between.clear()
@@ -197,70 +408,119 @@ class MacroRecorderCore:
             self._ensure_gap_count()
         self._notify_ui()
 
+    def _mutable_steps(self, section_index):
+        # Step lists handed out by frozen_snapshot are shared, so copy before writing
+        section = self.sections[section_index]
+        steps = section["steps"]
+        self.section_tokens[section_index] = next(self._tokens)
+        if id(steps) in self._frozen_steps:
+            steps = list(steps)
+            section["steps"] = steps
+        return steps
+
+    def _invalidate_no_lock(self, section_index, step_index):
+        # Steps from step_index on changed: cached timings are stale, and so is a
+        # resume point at or after them
+        self.timeline.invalidate(section_index, step_index)
+        self._drop_checkpoint_no_lock(section_index, step_index)
+
+    def _drop_checkpoint_no_lock(self, section_index, step_index=0):
+        checkpoint = self.checkpoint
+        if checkpoint is not None and (section_index, step_index) <= (checkpoint["section"], checkpoint["step"]):
+            self.checkpoint = None
+
     def _add_step_no_lock(self, step):
         if self.active_section_index is None:
             return
-        self.sections[self.active_section_index]["steps"].append(step)
+        steps = self._mutable_steps(self.active_section_index)
+        changed = self.input_filter.push(step, steps)
+        if changed is not None:
+            self._invalidate_no_lock(self.active_section_index, changed)
+
+    def _flush_input_filter_no_lock(self):
+        if self.active_section_index is None:
+            return
+        steps = self._mutable_steps(self.active_section_index)
+        changed = self.input_filter.flush(steps)
+        if changed is not None:
+            self._invalidate_no_lock(self.active_section_index, changed)
 
     def add_delay_step(self, section_index, delay_ms):
         with self._lock:
             if 0 <= section_index < len(self.sections):
-                self.sections[section_index]["steps"].append({"type": "delay", "delay": int(delay_ms), "unit": "ms"})
+                steps = self._mutable_steps(section_index)
+                steps.append(delay_step(int(delay_ms)))
+                self._invalidate_no_lock(section_index, len(steps) - 1)
+        self._notify_ui()
+
+    def add_wait_step(self, section_index, step):
+        if step.get("type") not in screen_waits.CONDITIONS:
+            raise ValueError(f"Unknown wait step type: {step.get('type')}")
+        with self._lock:
+            if 0 <= section_index < len(self.sections):
+                steps = self._mutable_steps(section_index)
+                steps.append(dict(step))
+                self._invalidate_no_lock(section_index, len(steps) - 1)
         self._notify_ui()
 
     def delete_step(self, section_index, step_index):
         with self._lock:
             if 0 <= section_index < len(self.sections):
-                steps = self.sections[section_index]["steps"]
+                steps = self._mutable_steps(section_index)
                 if 0 <= step_index < len(steps):
                     del steps[step_index]
+                    self._invalidate_no_lock(section_index, step_index)
         self._notify_ui()
 
     def move_step_up(self, section_index, step_index):
         with self._lock:
             if 0 <= section_index < len(self.sections):
-                steps = self.sections[section_index]["steps"]
+                steps = self._mutable_steps(section_index)
                 if 1 <= step_index < len(steps):
                     steps[step_index - 1], steps[step_index] = steps[step_index], steps[step_index - 1]
+                    self._invalidate_no_lock(section_index, step_index - 1)
         self._notify_ui()
 
     def move_step_down(self, section_index, step_index):
         with self._lock:
             if 0 <= section_index < len(self.sections):
-                steps = self.sections[section_index]["steps"]
+                steps = self._mutable_steps(section_index)
                 if 0 <= step_index < len(steps) - 1:
                     steps[step_index + 1], steps[step_index] = steps[step_index], steps[step_index + 1]
+                    self._invalidate_no_lock(section_index, step_index)
         self._notify_ui()
 
     def block_move_up(self, section_index, start_idx, end_idx):
         with self._lock:
             if 0 <= section_index < len(self.sections):
-                steps = self.sections[section_index]["steps"]
+                steps = self._mutable_steps(section_index)
                 if 0 <= start_idx <= end_idx < len(steps) and start_idx > 0:
                     block = steps[start_idx:end_idx + 1]
                     steps[start_idx:end_idx + 1] = []
                     steps[start_idx - 1:start_idx - 1] = block
+                    self._invalidate_no_lock(section_index, start_idx - 1)
         self._notify_ui()
 
     def block_move_down(self, section_index, start_idx, end_idx):
         with self._lock:
             if 0 <= section_index < len(self.sections):
-                steps = self.sections[section_index]["steps"]
+                steps = self._mutable_steps(section_index)
                 if 0 <= start_idx <= end_idx < len(steps) - 1:
                     block = steps[start_idx:end_idx + 1]
                     steps[start_idx:end_idx + 1] = []
                     steps[end_idx + 1:end_idx + 1] = block
+                    self._invalidate_no_lock(section_index, start_idx)
         self._notify_ui()
 
     def edit_delay(self, section_index, step_index, new_delay_ms):
         with self._lock:
             if 0 <= section_index < len(self.sections):
-                steps = self.sections[section_index]["steps"]
+                steps = self._mutable_steps(section_index)
                 if 0 <= step_index < len(steps):
                     step = steps[step_index]
                     if step.get("type") == "delay":
-                        step["delay"] = int(new_delay_ms)
-                        step["unit"] = "ms"
+                        steps[step_index] = compact_step(dict(step, delay=int(new_delay_ms), unit="ms"))
+                        self._invalidate_no_lock(section_index, step_index)
         self._notify_ui()
 
     def set_between_delay(self, gap_index, ms):
@@ -273,13 +533,21 @@ class MacroRecorderCore:
         with self._lock:
             self.sections.clear()
             self.delays_between.clear()
+            self.timeline.reset(0)
+            self.section_tokens = []
             self.active_section_index = None
+            self.reference = None
+            self.checkpoint = None
         self._notify_ui()
 
     def move_section_left(self, idx):
         with self._lock:
             if 1 <= idx < len(self.sections):
                 self.sections[idx - 1], self.sections[idx] = self.sections[idx], self.sections[idx - 1]
+                self.timeline.swap_sections(idx - 1, idx)
+                self._drop_checkpoint_no_lock(idx - 1)
+                tokens = self.section_tokens
+                tokens[idx - 1], tokens[idx] = tokens[idx], tokens[idx - 1]
                 if self.active_section_index == idx:
                     self.active_section_index = idx - 1
                 elif self.active_section_index == idx - 1:
@@ -290,94 +558,250 @@ class MacroRecorderCore:
         with self._lock:
             if 0 <= idx < len(self.sections) - 1:
                 self.sections[idx + 1], self.sections[idx] = self.sections[idx], self.sections[idx + 1]
+                self.timeline.swap_sections(idx, idx + 1)
+                self._drop_checkpoint_no_lock(idx)
+                tokens = self.section_tokens
+                tokens[idx + 1], tokens[idx] = tokens[idx], tokens[idx + 1]
                 if self.active_section_index == idx:
                     self.active_section_index = idx + 1
                 elif self.active_section_index == idx + 1:
                     self.active_section_index = idx
         self._notify_ui()
 
-    def play_all(self, stop_event=None):
-        snapshot = self.snapshot_sections()
-        gaps = self.snapshot_between_delays()
-        for s_idx, section in enumerate(snapshot):
-            for a_idx, action in enumerate(section["steps"]):
-                if stop_event and stop_event.is_set():
-                    return
-                self._playback_notify(s_idx, a_idx, True)
-                self._execute_action(action, stop_event)
-                self._playback_notify(s_idx, a_idx, False)
-            if s_idx < len(snapshot) - 1:
-                delay_ms = int(gaps[s_idx]) if s_idx < len(gaps) else 0
-                if delay_ms > 0:
-                    self._playback_notify(s_idx, -1, True)
-                    self._sleep_with_interrupt(delay_ms / 1000.0, stop_event)
-                    self._playback_notify(s_idx, -1, False)
-
-    def _sleep_with_interrupt(self, seconds, stop_event=None):
-        start = time.time()
-        while time.time() - start < seconds:
-            if stop_event and stop_event.is_set():
-                return
-            time.sleep(0.01)
+    def _reference_screen(self, reference):
+        # Recorded coordinates are checked against the screen they were recorded on
+        return tuple(reference["screen"]) if reference is not None else None
+
+    def validate(self):
+        sections, gaps, _revision, tokens = self.frozen_snapshot()
+        return self.pipeline.validate(sections, tokens, gaps, screen_size=self._reference_screen(self.reference))
+
+    def section_hashes(self):
+        sections, _gaps, _revision, tokens = self.frozen_snapshot()
+        return self.pipeline.section_hashes(sections, tokens)
 
-    def _execute_action(self, action, stop_event=None):
+    def play_all(self, stop_event=None, validate=False):
+        self.play_from(0, 0, stop_event, validate)
+
+    def play_from(self, section_index, step_index, stop_event=None, validate=False, char_index=0):
+        # char_index skips the characters of a type_text start step that were already typed
+        with self._lock:
+            if not (0 <= section_index < len(self.sections)):
+                return
+            snapshot = [{"name": s["name"], "steps": list(s["steps"])} for s in self.sections]
+            gaps = list(self.delays_between)
+            tokens = list(self.section_tokens)
+            step_index = max(0, min(step_index, len(snapshot[section_index]["steps"])))
+            starts = self.timeline.section_starts(self.sections, self.delays_between)
+            offsets = [list(self.timeline.section_offsets(i, s["steps"])) for i, s in enumerate(self.sections)]
+            held_keys, held_buttons = self.timeline.held_state(self.sections, section_index, step_index)
+            reference = self.reference
+        if validate:
+            self.pipeline.check(snapshot, tokens, gaps, screen_size=self._reference_screen(reference))
+        # One transform per run; mapped sections are cached by the mapper
+        transform = self.replay_transform(reference)
+        if transform is not IDENTITY:
+            snapshot = self.coordinates.map_sections(snapshot, tokens, transform)
+            held_buttons = {b: transform.apply(*pos) for b, pos in held_buttons.items()}
+        self.checkpoint = None
+        waiter = self.waiter_factory()
+        stats = RunStats(waiter)
+        start_ms = starts[section_index] + offsets[section_index][step_index]
+        progress = ProgressTracker(starts, offsets, self._progress_notify if self.progress_callback else None,
+                                   self.playback_clock, start_ms=start_ms)
+        held = {("key", k): True for k in held_keys}
+        held.update((("button", b), pos) for b, pos in held_buttons.items())
+        try:
+            self._restore_held_state(held_keys, held_buttons)
+            for s_idx in range(section_index, len(snapshot)):
+                steps = snapshot[s_idx]["steps"]
+                first = step_index if s_idx == section_index else 0
+                for a_idx in range(first, len(steps)):
+                    if stop_event and stop_event.is_set():
+                        self._interrupted(held, s_idx, a_idx)
+                        return
+                    progress.update(s_idx, a_idx)
+                    self._playback_notify(s_idx, a_idx, True)
+                    action = steps[a_idx]
+                    if action.get("type") == "type_text":
+                        start = char_index if (s_idx, a_idx) == (section_index, step_index) else 0
+                        typed = self._type_text(action, stop_event, waiter, start)
+                        if typed < len(action.get("text", "")):
+                            # Stopped mid-text: resume types only the rest
+                            self._playback_notify(s_idx, a_idx, False)
+                            self._interrupted(held, s_idx, a_idx, typed)
+                            return
+                    else:
+                        self._execute_action(action, stop_event, waiter)
+                    apply_held_effect(held, action)
+                    self._playback_notify(s_idx, a_idx, False)
+                    if stop_event and stop_event.is_set() and action.get("type") in ("delay",) + WAIT_STEPS:
+                        # The wait was cut short, so resuming starts with it again
+                        self._interrupted(held, s_idx, a_idx)
+                        return
+                if s_idx < len(snapshot) - 1:
+                    delay_ms = int(gaps[s_idx]) if s_idx < len(gaps) else 0
+                    if delay_ms > 0:
+                        progress.update(s_idx, -1)
+                        self._playback_notify(s_idx, -1, True)
+                        completed = self._sleep_with_interrupt(delay_ms / 1000.0, stop_event, waiter)
+                        self._playback_notify(s_idx, -1, False)
+                        if not completed:
+                            self._interrupted(held, s_idx, len(steps))
+                            return
+            progress.update(None, None, force=True)
+        finally:
+            self.last_run_stats = stats.finish()
+
+    def resume(self, stop_event=None, validate=False):
+        checkpoint = self.checkpoint
+        if checkpoint is None:
+            return
+        self.play_from(checkpoint["section"], checkpoint["step"], stop_event, validate, checkpoint.get("char", 0))
+
+    def _interrupted(self, held, section_index, step_index, char_index=0):
+        # step_index == len(steps) resumes at the gap after the section; keys
+        # still held are released now and pressed again by play_from. char is
+        # only set for a type_text step stopped part way through.
+        self.checkpoint = {"section": section_index, "step": step_index}
+        if char_index:
+            self.checkpoint["char"] = char_index
+        for (kind, name), value in held.items():
+            if kind == "key" and value:
+                self._key_up(name)
+            elif kind == "button" and value is not None:
+                self.backend.mouseUp(button=name)
+
+    def _restore_held_state(self, held_keys, held_buttons):
+        for key in held_keys:
+            self._key_down(key)
+        for button, (x, y) in held_buttons.items():
+            self.backend.moveTo(x, y)
+            self.backend.mouseDown(button=button)
+
+    def _sleep_with_interrupt(self, seconds, stop_event=None, waiter=None):
+        return (waiter or self.waiter_factory()).wait(seconds, stop_event)
+
+    def _execute_action(self, action, stop_event=None, waiter=None):
         t = action.get("type")
         if t == "delay":
-            unit = action.get("unit", "ms")
-            if unit == "ms":
-                sleep_time = action["delay"] / 1000
-            elif unit == "secs":
-                sleep_time = action["delay"]
-            elif unit == "mins":
-                sleep_time = action["delay"] * 60
-            elif unit == "hrs":
-                sleep_time = action["delay"] * 3600
-            else:
-                sleep_time = action["delay"] / 1000
-            self._sleep_with_interrupt(sleep_time, stop_event)
+            sleep_time = delay_seconds(action)
+            self._sleep_with_interrupt(sleep_time, stop_event, waiter)
         elif t == "press":
-            key = action.get("key")
-            if key in ("cmd", "cmd_r", "win"):
-                pyautogui.keyDown("winleft")
-            else:
-                pyautogui.keyDown(key)
+            self._key_down(action.get("key"))
         elif t == "release":
-            key = action.get("key")
-            if key in ("cmd", "cmd_r", "win"):
-                pyautogui.keyUp("winleft")
-            else:
-                pyautogui.keyUp(key)
+            self._key_up(action.get("key"))
+        elif t == "type_text":
+            self._type_text(action, stop_event, waiter)
         elif t == "mouse_press":
             x, y, btn = action["x"], action["y"], action["button"]
-            pyautogui.moveTo(x, y)
-            pyautogui.mouseDown(button=btn)
+            self.backend.moveTo(x, y)
+            self.backend.mouseDown(button=btn)
         elif t == "mouse_release":
             x, y, btn = action["x"], action["y"], action["button"]
-            pyautogui.moveTo(x, y)
-            pyautogui.mouseUp(button=btn)
+            self.backend.moveTo(x, y)
+            self.backend.mouseUp(button=btn)
+        elif t == "mouse_click":
+            x, y, btn = action["x"], action["y"], action["button"]
+            self.backend.moveTo(x, y)
+            self.backend.mouseDown(button=btn)
+            self._sleep_with_interrupt(action.get("hold", 0) / 1000.0, None, waiter)
+            self.backend.mouseUp(button=btn)
+        elif t in screen_waits.CONDITIONS:
+            screen_waits.wait_for(action, (waiter or self.waiter_factory()).wait, stop_event, self.wait_poll_ms,
+                                  self.playback_clock)
+
+    def _type_text(self, action, stop_event=None, waiter=None, start=0):
+        # Types text[start:] and returns how many characters of text are typed
+        # once it stops, which is less than len(text) only after a stop
+        text = action.get("text", "")
+        timing = action.get("timing") or []
+        # hold + gap per character; the last character has no gap after it
+        periods = [timing[i] + timing[i + 1] for i in range(0, len(timing) - 1, 2)]
+        mean = sum(periods) / len(periods) if periods else 0
+        if all(abs(p - mean) <= self.type_text_tolerance_ms for p in periods):
+            # Close enough to a steady rhythm: batched backend calls, one per
+            # chunk when a stop can cut the text short
+            chunk = len(text) if stop_event is None or mean <= 0 else max(1, int(TYPE_TEXT_CHUNK_MS / mean))
+            for i in range(start, len(text), chunk):
+                if stop_event and stop_event.is_set():
+                    return i
+                self.backend.write(text[i:i + chunk], interval=mean / 1000.0)
+            return len(text)
+        waiter = waiter or self.waiter_factory()
+        for i in range(start, len(text)):
+            if stop_event and stop_event.is_set():
+                return i
+            char = text[i]
+            self.backend.keyDown(char)
+            if 2 * i < len(timing):
+                waiter.wait(timing[2 * i] / 1000.0, stop_event)
+            self.backend.keyUp(char)
+            if 2 * i + 1 < len(timing):
+                waiter.wait(timing[2 * i + 1] / 1000.0, stop_event)
+        return len(text)
+
+    def _key_down(self, key):
+        self.backend.keyDown(key_mapping.backend_key(key))
+
+    def _key_up(self, key):
+        self.backend.keyUp(key_mapping.backend_key(key))
 
     def save_macro(self, path):
-        with self._lock:
-            data = {
-                "sections": self.sections,
-                "delays_between": self.delays_between
-            }
+        sections, gaps, _revision, tokens = self.frozen_snapshot()
+        text = self.pipeline.serialize(sections, tokens, gaps, self.reference)
         with open(path, "w") as f:
-            json.dump(data, f)
+            f.write(text)
 
-    def load_macro(self, path):
+    def load_macro(self, path, validate=False):
         with open(path, "r") as f:
-            data = json.load(f)
+            data = json.load(f, object_hook=compact_step)
+        self.load_data(data, validate)
+
+    def load_data(self, data, validate=False, check_key_names=True):
+        if isinstance(data, list):
+            sections = data
+            delays_between = [0] * max(0, len(sections) - 1)
+            reference = None
+        else:
+            sections = data.get("sections", [])
+            delays_between = data.get("delays_between", [0] * max(0, len(sections) - 1))
+            reference = coordinate_transform.check_reference(data.get("reference"))
+        if validate:
+            check_macro(sections, delays_between, screen_size=self._reference_screen(reference))
+        elif check_key_names:
+            check_keys(sections)
+        sections = [dict(s, steps=compact_steps(s["steps"])) if isinstance(s, dict) and isinstance(s.get("steps"), list)
+                    else s for s in sections]
         with self._lock:
-            if isinstance(data, list):
-                self.sections = data
-                self.delays_between = [0] * max(0, len(self.sections) - 1)
-            else:
-                self.sections = data.get("sections", [])
-                self.delays_between = data.get("delays_between", [0] * max(0, len(self.sections) - 1))
+            self.sections = sections
+            self.delays_between = delays_between
+            self.reference = reference
+            self.checkpoint = None
+            self.timeline.reset(len(sections))
+            self.section_tokens = [next(self._tokens) for _ in sections]
             self._ensure_gap_count()
         self._notify_ui()
 
+    def macro_duration_ms(self):
+        with self._lock:
+            return self.timeline.section_starts(self.sections, self.delays_between)[-1]
+
+    def step_offset_ms(self, section_index, step_index):
+        with self._lock:
+            starts = self.timeline.section_starts(self.sections, self.delays_between)
+            offsets = self.timeline.section_offsets(section_index, self.sections[section_index]["steps"])
+            return starts[section_index] + offsets[min(step_index, len(offsets) - 1)]
+
+    def frozen_snapshot(self):
+        # O(sections) snapshot sharing the step lists. Every list still in use is
+        # frozen, and lists dropped from the set were already replaced by copies,
+        # so older snapshots stay valid too.
+        with self._lock:
+            sections = [{"name": s["name"], "steps": s["steps"]} for s in self.sections]
+            self._frozen_steps = {id(s["steps"]): s["steps"] for s in sections}
+            return sections, list(self.delays_between), self.revision, list(self.section_tokens)
+
     def snapshot_sections(self):
         with self._lock:
             return [{"name": s["name"], "steps": list(s["steps"])} for s in self.sections]
@@ -0,0 +1,28 @@
+UNIT_SECONDS = {
+    "ms": 0.001,
+    "secs": 1,
+    "mins": 60,
+    "hrs": 3600,
+}
+
+KEY_STEPS = ("press", "release")
+TEXT_STEPS = ("type_text",)
+MOUSE_STEPS = ("mouse_press", "mouse_release", "mouse_click")
+WAIT_STEPS = ("wait_pixel", "wait_image")
+STEP_TYPES = ("delay",) + KEY_STEPS + TEXT_STEPS + MOUSE_STEPS + WAIT_STEPS
+
+
+def delay_seconds(step):
+    return step["delay"] * UNIT_SECONDS.get(step.get("unit", "ms"), 0.001)
+
+
+def step_duration_ms(step):
+    # Fixed time a step is known to take; waits end early so they count as zero
+    t = step.get("type")
+    if t == "delay":
+        return delay_seconds(step) * 1000
+    if t == "type_text":
+        return sum(step.get("timing") or ())
+    if t == "mouse_click":
+        return step.get("hold", 0)
+    return 0
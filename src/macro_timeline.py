@@ -0,0 +1,167 @@
+from macro_steps import step_duration_ms
+
+CHECKPOINT_STEPS = 4096
+
+
+def apply_held_effect(effect, step):
+    # Track what a step leaves held: ("key", name) -> True/False and
+    # ("button", name) -> press position or None
+    t = step.get("type")
+    if t == "press":
+        effect[("key", step.get("key"))] = True
+    elif t == "release":
+        effect[("key", step.get("key"))] = False
+    elif t == "mouse_press":
+        effect[("button", step.get("button"))] = (step.get("x"), step.get("y"))
+    elif t == "mouse_release":
+        effect[("button", step.get("button"))] = None
+
+
+class MacroTimeline:
+    def __init__(self):
+        # offsets[s][i] is the start time (ms) of step i within section s and
+        # offsets[s][-1] its length; dirty[s] is the first stale index or None.
+        # effects[s][k] is the held-state effect of steps[:k * CHECKPOINT_STEPS]
+        # and section_effects[s] that of the whole section.
+        self._offsets = []
+        self._effects = []
+        self._section_effects = []
+        self._dirty = []
+
+    def reset(self, count):
+        self._offsets = [[0.0] for _ in range(count)]
+        self._effects = [[{}] for _ in range(count)]
+        self._section_effects = [{} for _ in range(count)]
+        self._dirty = [0] * count
+
+    def insert_section(self, idx):
+        self._offsets.insert(idx, [0.0])
+        self._effects.insert(idx, [{}])
+        self._section_effects.insert(idx, {})
+        self._dirty.insert(idx, 0)
+
+    def remove_section(self, idx):
+        if 0 <= idx < len(self._offsets):
+            del self._offsets[idx]
+            del self._effects[idx]
+            del self._section_effects[idx]
+            del self._dirty[idx]
+
+    def swap_sections(self, a, b):
+        for lst in (self._offsets, self._effects, self._section_effects, self._dirty):
+            lst[a], lst[b] = lst[b], lst[a]
+
+    def invalidate(self, idx, step_index):
+        if 0 <= idx < len(self._dirty):
+            step_index = max(0, step_index)
+            current = self._dirty[idx]
+            self._dirty[idx] = step_index if current is None else min(current, step_index)
+
+    def section_offsets(self, idx, steps):
+        self._refresh(idx, steps)
+        return self._offsets[idx]
+
+    def _refresh(self, idx, steps):
+        start = self._dirty[idx]
+        if start is None:
+            return
+        offsets = self._offsets[idx]
+        start = min(start, len(offsets) - 1, len(steps))
+        del offsets[start + 1:]
+        t = offsets[start]
+        append = offsets.append
+        for step in steps[start:]:
+            t += step_duration_ms(step)
+            append(t)
+
+        effects = self._effects[idx]
+        kept = start // CHECKPOINT_STEPS
+        del effects[kept + 1:]
+        effect = dict(effects[kept])
+        first = kept * CHECKPOINT_STEPS
+        for i in range(first, len(steps)):
+            if i > first and i % CHECKPOINT_STEPS == 0:
+                effects.append(dict(effect))
+            apply_held_effect(effect, steps[i])
+        if len(steps) > first and len(steps) % CHECKPOINT_STEPS == 0:
+            # Keep an entry for len(steps) too, where appends and resumes after the last step look
+            effects.append(dict(effect))
+        self._section_effects[idx] = effect
+        self._dirty[idx] = None
+
+    def held_state(self, sections, section_idx, step_idx):
+        # Keys and buttons held just before sections[section_idx].steps[step_idx]
+        state = {}
+        for idx in range(section_idx):
+            self._refresh(idx, sections[idx]["steps"])
+            state.update(self._section_effects[idx])
+        steps = sections[section_idx]["steps"]
+        self._refresh(section_idx, steps)
+        step_idx = max(0, min(step_idx, len(steps)))
+        k = step_idx // CHECKPOINT_STEPS
+        state.update(self._effects[section_idx][k])
+        for i in range(k * CHECKPOINT_STEPS, step_idx):
+            apply_held_effect(state, steps[i])
+        keys = [name for (kind, name), held in state.items() if kind == "key" and held]
+        buttons = {name: pos for (kind, name), pos in state.items() if kind == "button" and pos is not None}
+        return keys, buttons
+
+    def section_starts(self, sections, gaps):
+        # Start time of every section plus the total as the final entry
+        starts = []
+        t = 0.0
+        for idx, section in enumerate(sections):
+            starts.append(t)
+            t += self.section_offsets(idx, section["steps"])[-1]
+            if idx < len(sections) - 1 and idx < len(gaps):
+                t += max(0, gaps[idx])
+        starts.append(t)
+        return starts
+
+
+class ProgressTracker:
+    def __init__(self, section_starts, offsets, callback, clock, interval=0.1, start_ms=0.0):
+        self.section_starts = section_starts
+        self.start_ms = start_ms
+        self.offsets = offsets
+        self.total_ms = section_starts[-1]
+        self.callback = callback
+        self.clock = clock
+        self.interval = interval
+        self.started = clock()
+        self._last_publish = None
+
+    def planned_ms(self, section_idx, step_idx):
+        base = self.section_starts[section_idx]
+        if step_idx < 0:
+            return base + self.offsets[section_idx][-1]
+        return base + self.offsets[section_idx][step_idx]
+
+    def update(self, section_idx, step_idx, force=False):
+        if self.callback is None:
+            return
+        now = self.clock()
+        if not force and self._last_publish is not None and now - self._last_publish < self.interval:
+            return
+        self._last_publish = now
+        planned = self.planned_ms(section_idx, step_idx) if section_idx is not None else self.total_ms
+        elapsed_ms = (now - self.started) * 1000
+        planned_elapsed = planned - self.start_ms
+        self.callback({
+            "section": section_idx,
+            "step": step_idx,
+            "percent": 100.0 * planned / self.total_ms if self.total_ms else 100.0,
+            "elapsed_s": elapsed_ms / 1000,
+            "eta_s": max(0.0, self.total_ms - planned) / 1000,
+            "lateness_ms": elapsed_ms - planned_elapsed,
+        })
+
+
+def format_progress(info):
+    return (f"{info['percent']:.1f}%  elapsed {_hms(info['elapsed_s'])}  "
+            f"ETA {_hms(info['eta_s'])}  late {info['lateness_ms']:+.0f} ms")
+
+
+def _hms(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
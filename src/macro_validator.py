@@ -0,0 +1,174 @@
+import os
+import numbers
+
+import pyautogui
+
+import key_mapping
+from macro_steps import UNIT_SECONDS, WAIT_STEPS
+from screen_waits import DEFAULT_TIMEOUT_MS
+
+MOUSE_BUTTONS = ("left", "right", "middle")
+MAX_REPORTED_ISSUES = 1000
+
+
+class MacroValidationError(ValueError):
+    def __init__(self, report):
+        self.report = report
+        errors = [i for i in report["issues"] if i["severity"] == "error"]
+        super().__init__(f"Macro has {len(errors)} error(s): " + "; ".join(format_issue(i) for i in errors[:5]))
+
+
+def format_issue(issue):
+    if issue["step"] is None:
+        where = f"gap {issue['section'] + 1}"
+    else:
+        where = f"section {issue['section'] + 1}, step {issue['step'] + 1}"
+    return f"{where}: {issue['message']}"
+
+
+def default_key_names():
+    return key_mapping.STORED_NAMES
+
+
+def validate_macro(sections, delays_between, screen_size=None, key_names=None):
+    if screen_size is None:
+        screen_size = tuple(pyautogui.size())
+    if key_names is None:
+        key_names = default_key_names()
+    width, height = screen_size
+
+    issues = []
+    error_count = 0
+
+    def report(section, step, severity, code, message):
+        nonlocal error_count
+        if severity == "error":
+            error_count += 1
+        if len(issues) < MAX_REPORTED_ISSUES:
+            issues.append({"section": section, "step": step, "severity": severity, "code": code, "message": message})
+
+    held_keys = {}  # key -> (section, step) of the press
+    held_buttons = {}
+    section_reports = []
+    total_ms = 0.0
+    max_wait_ms = 0
+
+    for s_idx, section in enumerate(sections):
+        section_ms = 0.0
+        presses = releases = 0
+        for a_idx, step in enumerate(section.get("steps", ())):
+            t = step.get("type")
+            if t == "delay":
+                value = step.get("delay")
+                unit = step.get("unit", "ms")
+                if not isinstance(value, numbers.Real):
+                    report(s_idx, a_idx, "error", "bad_delay", f"delay {value!r} is not a number")
+                elif value < 0:
+                    report(s_idx, a_idx, "error", "negative_delay", f"negative delay {value} {unit}")
+                elif unit not in UNIT_SECONDS:
+                    report(s_idx, a_idx, "error", "bad_unit", f"unknown delay unit {unit!r}")
+                else:
+                    section_ms += value * UNIT_SECONDS[unit] * 1000
+            elif t == "press" or t == "release":
+                key = step.get("key")
+                if key not in key_names:
+                    report(s_idx, a_idx, "error", "unknown_key", f"unknown key {key!r}")
+                if t == "press":
+                    presses += 1
+                    if key in held_keys:
+                        report(s_idx, a_idx, "warning", "repeat_press", f"{key!r} pressed again while held")
+                    held_keys[key] = (s_idx, a_idx)
+                else:
+                    releases += 1
+                    if held_keys.pop(key, None) is None:
+                        report(s_idx, a_idx, "warning", "release_without_press", f"{key!r} released but not pressed")
+            elif t == "type_text":
+                text = step.get("text")
+                timing = step.get("timing") or []
+                if not isinstance(text, str):
+                    report(s_idx, a_idx, "error", "bad_text", f"type_text text {text!r} is not a string")
+                else:
+                    unknown = sorted({c for c in text if c not in key_names and c.lower() not in key_names})
+                    if unknown:
+                        report(s_idx, a_idx, "error", "unknown_key", f"unknown characters {''.join(unknown)!r}")
+                if any(not isinstance(v, numbers.Real) or v < 0 for v in timing):
+                    report(s_idx, a_idx, "error", "negative_delay", "type_text timing has negative or invalid entries")
+                else:
+                    section_ms += sum(timing)
+            elif t == "mouse_press" or t == "mouse_release" or t == "mouse_click":
+                x, y, button = step.get("x"), step.get("y"), step.get("button")
+                if button not in MOUSE_BUTTONS:
+                    report(s_idx, a_idx, "error", "unknown_button", f"unknown mouse button {button!r}")
+                if not (isinstance(x, numbers.Real) and isinstance(y, numbers.Real)
+                        and 0 <= x < width and 0 <= y < height):
+                    report(s_idx, a_idx, "error", "off_screen", f"({x}, {y}) is outside the {width}x{height} screen")
+                if t == "mouse_click":
+                    hold = step.get("hold", 0)
+                    if not isinstance(hold, numbers.Real) or hold < 0:
+                        report(s_idx, a_idx, "error", "negative_delay", f"invalid click hold {hold!r}")
+                    else:
+                        section_ms += hold
+                elif t == "mouse_press":
+                    held_buttons[button] = (s_idx, a_idx)
+                elif held_buttons.pop(button, None) is None:
+                    report(s_idx, a_idx, "warning", "release_without_press", f"mouse {button} released but not pressed")
+            elif t in WAIT_STEPS:
+                timeout = step.get("timeout", DEFAULT_TIMEOUT_MS)
+                if not isinstance(timeout, numbers.Real) or timeout < 0:
+                    report(s_idx, a_idx, "error", "bad_timeout", f"invalid wait timeout {timeout!r}")
+                else:
+                    max_wait_ms += timeout
+                if t == "wait_pixel":
+                    x, y = step.get("x"), step.get("y")
+                    if not (isinstance(x, numbers.Real) and isinstance(y, numbers.Real)
+                            and 0 <= x < width and 0 <= y < height):
+                        report(s_idx, a_idx, "error", "off_screen", f"({x}, {y}) is outside the {width}x{height} screen")
+                elif not os.path.exists(step.get("template") or ""):
+                    report(s_idx, a_idx, "error", "missing_template", f"template {step.get('template')!r} not found")
+            else:
+                report(s_idx, a_idx, "error", "unknown_step", f"unknown step type {t!r}")
+
+        section_reports.append({
+            "duration_ms": section_ms,
+            "presses": presses,
+            "releases": releases,
+            "held_keys": sorted(held_keys, key=str),
+            "held_buttons": sorted(held_buttons, key=str),
+        })
+        total_ms += section_ms
+
+        if s_idx < len(sections) - 1:
+            gap = delays_between[s_idx] if s_idx < len(delays_between) else 0
+            if not isinstance(gap, numbers.Real) or gap < 0:
+                report(s_idx, None, "error", "negative_delay", f"invalid between-section delay {gap!r}")
+            else:
+                total_ms += gap
+
+    for key, (s_idx, a_idx) in held_keys.items():
+        report(s_idx, a_idx, "error", "stuck_key", f"{key!r} is pressed but never released")
+    for button, (s_idx, a_idx) in held_buttons.items():
+        report(s_idx, a_idx, "error", "stuck_button", f"mouse {button} is pressed but never released")
+
+    return {
+        "ok": error_count == 0,
+        "error_count": error_count,
+        "issues": issues,
+        "duration_ms": total_ms,
+        "max_wait_ms": max_wait_ms,
+        "sections": section_reports,
+    }
+
+
+def check_keys(sections):
+    # Cheap load-time gate: every key name must resolve through key_mapping
+    issues = [{"section": s_idx, "step": a_idx, "severity": "error", "code": "unknown_key", "message": message}
+              for s_idx, a_idx, message in key_mapping.unknown_key_issues(sections)]
+    if issues:
+        raise MacroValidationError({"ok": False, "error_count": len(issues), "issues": issues[:MAX_REPORTED_ISSUES]})
+
+
+def check_macro(sections, delays_between, **kwargs):
+    report = validate_macro(sections, delays_between, **kwargs)
+    if not report["ok"]:
+        raise MacroValidationError(report)
+    return report
@@ -0,0 +1,205 @@
+import argparse
+import asyncio
+import itertools
+import json
+import threading
+
+from macro_recorder import MacroRecorderCore
+from macro_library import MacroLibrary
+from macro_validator import MacroValidationError
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_QUEUE = 1000
+
+# Newline-delimited JSON. Requests: {"cmd": "load" | "play" | "resume" | "stop" |
+# "status" | "subscribe", ...}; every request gets one {"ok": ...} reply and
+# subscribers additionally receive {"event": ...} lines.
+
+
+class RemoteControlServer:
+    def __init__(self, recorder=None, library=None, max_queue=MAX_QUEUE):
+        self.recorder = recorder or MacroRecorderCore()
+        self.library = library
+        self.max_queue = max_queue
+        self._jobs = None
+        self._job_ids = itertools.count(1)
+        self._current = None
+        self._stop_event = None
+        self._subscribers = set()
+        self._loop = None
+        self._last_progress = None
+        self._server = None
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+        self._loop = asyncio.get_running_loop()
+        self._jobs = asyncio.Queue(self.max_queue)
+        self.recorder.progress_callback = self._on_progress
+        if socket_path:
+            self._server = await asyncio.start_unix_server(self._handle_client, path=socket_path)
+        else:
+            self._server = await asyncio.start_server(self._handle_client, host, port)
+        self._worker = asyncio.create_task(self._run_jobs())
+        return self._server
+
+    async def serve_forever(self, **kwargs):
+        server = await self.start(**kwargs)
+        async with server:
+            await server.serve_forever()
+
+    def _on_progress(self, info):
+        # Called on the playback thread
+        self._loop.call_soon_threadsafe(self._publish_progress, info)
+
+    def _publish_progress(self, info):
+        self._last_progress = info
+        self._broadcast(dict(info, event="progress", job=self._current["id"] if self._current else None))
+
+    def _broadcast(self, event):
+        line = (json.dumps(event) + "\n").encode("utf-8")
+        for writer in list(self._subscribers):
+            if writer.is_closing():
+                self._subscribers.discard(writer)
+                continue
+            writer.write(line)
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    reply = await self._dispatch(request, writer)
+                except (ValueError, KeyError, TypeError) as e:
+                    reply = {"ok": False, "error": str(e)}
+                writer.write((json.dumps(reply) + "\n").encode("utf-8"))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._subscribers.discard(writer)
+            writer.close()
+
+    async def _dispatch(self, request, writer):
+        cmd = request["cmd"]
+        if cmd in ("load", "play", "resume"):
+            if self._jobs.full():
+                return {"ok": False, "error": "queue full"}
+            job = dict(_check_job(request), id=next(self._job_ids))
+            self._jobs.put_nowait(job)
+            return {"ok": True, "job": job["id"], "queued": self._jobs.qsize()}
+        if cmd == "stop":
+            cleared = 0
+            if request.get("clear"):
+                while not self._jobs.empty():
+                    self._jobs.get_nowait()
+                    self._jobs.task_done()
+                    cleared += 1
+            if self._stop_event:
+                self._stop_event.set()
+            return {"ok": True, "cleared": cleared}
+        if cmd == "status":
+            return {"ok": True, **self.status()}
+        if cmd == "subscribe":
+            self._subscribers.add(writer)
+            return {"ok": True}
+        raise ValueError(f"unknown command {cmd!r}")
+
+    def status(self):
+        current = self._current
+        return {
+            "state": "idle" if current is None else current["cmd"],
+            "job": current["id"] if current else None,
+            "queued": self._jobs.qsize() if self._jobs else 0,
+            "progress": self._last_progress if current else None,
+            "checkpoint": self.recorder.checkpoint,
+            "last_run_stats": self.recorder.last_run_stats,
+        }
+
+    async def _run_jobs(self):
+        while True:
+            job = await self._jobs.get()
+            self._current = job
+            self._last_progress = None
+            self._stop_event = threading.Event()
+            self._broadcast({"event": "job_started", "job": job["id"], "cmd": job["cmd"]})
+            try:
+                await self._loop.run_in_executor(None, self._run_job, job, self._stop_event)
+                event = {"event": "job_finished", "job": job["id"], "ok": True,
+                         "interrupted": self._stop_event.is_set()}
+                if job["cmd"] != "load":
+                    event["stats"] = self.recorder.last_run_stats
+                    event["checkpoint"] = self.recorder.checkpoint
+            except MacroValidationError as e:
+                event = {"event": "job_finished", "job": job["id"], "ok": False, "error": str(e)}
+            except Exception as e:
+                # Backend errors (e.g. pyautogui's fail-safe) end the job, never the worker
+                event = {"event": "job_finished", "job": job["id"], "ok": False,
+                         "error": f"{type(e).__name__}: {e}"}
+            finally:
+                self._current = None
+                self._stop_event = None
+                self._jobs.task_done()
+            self._broadcast(event)
+
+    def _run_job(self, job, stop_event):
+        # Runs on an executor thread against the one long-lived recorder
+        validate = bool(job.get("validate", False))
+        self.recorder.replay_target = job.get("target")
+        loaded = True
+        if job.get("macro") is not None:
+            if self.library is None:
+                self.library = MacroLibrary()
+                self.library.refresh()
+            self.recorder.load_data(self.library.load(job["macro"]), validate=validate, check_key_names=False)
+        elif job.get("path") is not None:
+            self.recorder.load_macro(job["path"], validate=validate)
+        else:
+            loaded = False
+        # A freshly loaded macro was already validated above
+        validate = validate and not loaded
+        if job["cmd"] == "play":
+            self.recorder.play_from(job["section"], job["step"], stop_event, validate)
+        elif job["cmd"] == "resume":
+            self.recorder.resume(stop_event, validate)
+
+
+def _check_job(request):
+    # Bad fields are rejected when the job is queued, not when it runs
+    job = dict(request)
+    for name in ("section", "step"):
+        value = job.get(name, 0)
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            raise ValueError(f"{name} must be a non-negative integer")
+        job[name] = value
+    # [left, top, width, height] to map the macro's reference onto; default is this screen/window
+    target = job.get("target")
+    if target is not None and not (isinstance(target, list) and len(target) == 4
+                                   and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in target)
+                                   and target[2] > 0 and target[3] > 0):
+        raise ValueError("target must be [left, top, width, height]")
+    for name in ("macro", "path"):
+        if job.get(name) is not None and not isinstance(job[name], str):
+            raise ValueError(f"{name} must be a string")
+    return job
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive macro playback from other processes.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--socket", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--library", help="macro library directory for {\"macro\": name} requests")
+    args = parser.parse_args()
+    library = None
+    if args.library:
+        library = MacroLibrary(args.library)
+        library.refresh()
+    server = RemoteControlServer(library=library)
+    asyncio.run(server.serve_forever(host=args.host, port=args.port, socket_path=args.socket))
+
+
+if __name__ == "__main__":
+    main()
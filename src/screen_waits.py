@@ -0,0 +1,137 @@
+import os
+import time
+from collections import OrderedDict
+
+import pyautogui
+
+try:
+    import numpy as np
+except ImportError:  # matching falls back to pyautogui.locate
+    np = None
+
+DEFAULT_POLL_MS = 50
+DEFAULT_TIMEOUT_MS = 10000
+DEFAULT_SCALE = 0.5
+DEFAULT_CONFIDENCE = 0.9
+
+
+class TemplateCache:
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, path, scale):
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+        key = (os.path.abspath(path), mtime, scale)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+        from PIL import Image
+        with Image.open(path) as img:
+            gray = _downscale(img.convert("L"), scale)
+            gray.load()
+        entry = _template_entry(gray)
+        self._entries[key] = entry
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+
+
+_template_cache = TemplateCache()
+
+
+def _downscale(img, scale):
+    if scale >= 1:
+        return img
+    w = max(1, int(img.width * scale))
+    h = max(1, int(img.height * scale))
+    return img.resize((w, h))
+
+
+def _template_entry(gray):
+    if np is None:
+        return {"image": gray}
+    arr = np.asarray(gray, dtype=np.float64)
+    return {"image": gray, "array": arr, "sum_sq": float((arr * arr).sum())}
+
+
+def _window_sums(arr, h, w):
+    # Sum of every h x w window via an integral image
+    ii = np.zeros((arr.shape[0] + 1, arr.shape[1] + 1))
+    ii[1:, 1:] = arr.cumsum(0).cumsum(1)
+    return ii[h:, w:] - ii[:-h, w:] - ii[h:, :-w] + ii[:-h, :-w]
+
+
+def _best_match_rms(screen, template):
+    # Root-mean-square difference of the best placement, computed for every
+    # placement at once: SSD = sum(I^2) - 2 * corr(I, T) + sum(T^2)
+    tmpl = template["array"]
+    h, w = tmpl.shape
+    H, W = screen.shape
+    if h > H or w > W:
+        return None
+    fh, fw = H + h - 1, W + w - 1
+    corr = np.fft.irfft2(
+        np.fft.rfft2(screen, (fh, fw)) * np.fft.rfft2(tmpl[::-1, ::-1], (fh, fw)),
+        (fh, fw),
+    )[h - 1:H, w - 1:W]
+    ssd = _window_sums(screen * screen, h, w) - 2 * corr + template["sum_sq"]
+    return float(np.sqrt(max(ssd.min(), 0) / (h * w)))
+
+
+def read_pixel(x, y):
+    shot = pyautogui.screenshot(region=(int(x), int(y), 1, 1))
+    return shot.getpixel((0, 0))[:3]
+
+
+def pixel_matches(step):
+    color = step.get("color", (0, 0, 0))
+    tolerance = int(step.get("tolerance", 0))
+    actual = read_pixel(step["x"], step["y"])
+    return all(abs(int(a) - int(c)) <= tolerance for a, c in zip(actual, color))
+
+
+def image_present(step, cache=None):
+    cache = cache or _template_cache
+    scale = float(step.get("scale", DEFAULT_SCALE))
+    confidence = float(step.get("confidence", DEFAULT_CONFIDENCE))
+    region = step.get("region")
+    shot = pyautogui.screenshot(region=tuple(region) if region else None)
+    template = cache.get(step["template"], scale)
+    screen = _downscale(shot.convert("L"), scale)
+    if np is None:
+        try:
+            return pyautogui.locate(template["image"], screen) is not None
+        except pyautogui.ImageNotFoundException:
+            return False
+    rms = _best_match_rms(np.asarray(screen, dtype=np.float64), template)
+    return rms is not None and rms <= (1.0 - confidence) * 255
+
+
+CONDITIONS = {
+    "wait_pixel": pixel_matches,
+    "wait_image": image_present,
+}
+
+
+def wait_for(step, sleep, stop_event=None, default_poll_ms=DEFAULT_POLL_MS, clock=time.perf_counter):
+    check = CONDITIONS[step["type"]]
+    timeout = int(step.get("timeout", DEFAULT_TIMEOUT_MS)) / 1000.0
+    poll = max(1, int(step.get("poll", default_poll_ms))) / 1000.0
+    deadline = clock() + timeout
+    while True:
+        if stop_event and stop_event.is_set():
+            return False
+        if check(step):
+            return True
+        remaining = deadline - clock()
+        if remaining <= 0:
+            return False
+        sleep(min(poll, remaining), stop_event)
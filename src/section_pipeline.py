@@ -0,0 +1,189 @@
+import hashlib
+import json
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import pyautogui
+
+from macro_validator import validate_macro, default_key_names, MacroValidationError, MAX_REPORTED_ISSUES
+from step_records import steps_json
+
+PARALLEL_THRESHOLD = 200000  # dirty steps before compiling in worker processes
+# Issues that depend on neighbouring sections are recomputed when combining
+CROSS_SECTION_CODES = ("stuck_key", "stuck_button")
+
+
+def encode_section(section):
+    # Same text as json.dumps({"name": ..., "steps": ...}); shared step records reuse their text
+    fragment = ('{"name": ' + json.dumps(section["name"]) + ', "steps": ['
+                + steps_json(section["steps"]) + "]}")
+    return {"hash": hashlib.sha1(fragment.encode("utf-8")).hexdigest(), "json": fragment}
+
+
+def compile_section(section, screen_size, key_names):
+    report = validate_macro([section], [], screen_size=screen_size, key_names=key_names)
+    # Net key/button effect of the section: name -> (held at end, index of last event),
+    # plus names whose first event is a release and keys whose first event is a press
+    effects = {}
+    opens = []
+    first_presses = []
+    for a_idx, step in enumerate(section["steps"]):
+        t = step.get("type")
+        if t == "press" or t == "release":
+            name = ("key", step.get("key"))
+        elif t == "mouse_press" or t == "mouse_release":
+            name = ("button", step.get("button"))
+        else:
+            continue
+        pressed = t in ("press", "mouse_press")
+        if name not in effects:
+            if not pressed:
+                opens.append((name, a_idx))
+            elif name[0] == "key":
+                first_presses.append((name, a_idx))
+        effects[name] = (pressed, a_idx)
+    open_steps = {a_idx for _, a_idx in opens}
+    issues = [i for i in report["issues"] if i["code"] not in CROSS_SECTION_CODES
+              and not (i["code"] == "release_without_press" and i["step"] in open_steps)]
+    return {
+        "issues": issues,
+        "error_count": report["error_count"] - sum(1 for i in report["issues"] if i["code"] in CROSS_SECTION_CODES),
+        "duration_ms": report["duration_ms"],
+        "max_wait_ms": report["max_wait_ms"],
+        "summary": report["sections"][0],
+        "effects": effects,
+        "opens": opens,
+        "first_presses": first_presses,
+    }
+
+
+class SectionPipeline:
+    def __init__(self, max_workers=None, parallel_threshold=PARALLEL_THRESHOLD):
+        self.max_workers = max_workers
+        self.parallel_threshold = parallel_threshold
+        self._fragments = {}  # section token -> encoded section, whatever the settings
+        self._cache = {}  # section token -> compiled section for self._settings
+        self._settings = None
+        self._lock = threading.Lock()
+
+    def compile(self, sections, tokens, screen_size=None, key_names=None):
+        if screen_size is None:
+            screen_size = tuple(pyautogui.size())
+        if key_names is None:
+            key_names = default_key_names()
+        with self._lock:
+            settings = (tuple(screen_size), key_names)
+            if settings != self._settings:
+                self._cache.clear()
+                self._settings = settings
+            dirty = [i for i, token in enumerate(tokens) if token not in self._cache]
+            if dirty:
+                fresh = self._compile_dirty([sections[i] for i in dirty], settings)
+                for i, compiled in zip(dirty, fresh):
+                    self._cache[tokens[i]] = compiled
+            live = set(tokens)
+            for token in [t for t in self._cache if t not in live]:
+                del self._cache[token]
+            return [self._cache[token] for token in tokens]
+
+    def _compile_dirty(self, sections, settings):
+        screen_size, key_names = settings
+        total = sum(len(s["steps"]) for s in sections)
+        if len(sections) < 2 or total < self.parallel_threshold:
+            return [compile_section(s, screen_size, key_names) for s in sections]
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(compile_section, s, screen_size, key_names) for s in sections]
+            return [f.result() for f in futures]
+
+    def encode(self, sections, tokens):
+        # Encoding doesn't depend on the screen or key names, so it is cached apart
+        # from validation and never invalidates it
+        with self._lock:
+            for section, token in zip(sections, tokens):
+                if token not in self._fragments:
+                    self._fragments[token] = encode_section(section)
+            live = set(tokens)
+            for token in [t for t in self._fragments if t not in live]:
+                del self._fragments[token]
+            return [self._fragments[token] for token in tokens]
+
+    def section_hashes(self, sections, tokens):
+        return [e["hash"] for e in self.encode(sections, tokens)]
+
+    def serialize(self, sections, tokens, delays_between, reference=None):
+        # Same text json.dump would produce, stitched from cached per-section fragments
+        encoded = self.encode(sections, tokens)
+        text = ('{"sections": [' + ", ".join(e["json"] for e in encoded) + '], "delays_between": '
+                + json.dumps(delays_between))
+        if reference is not None:
+            text += ', "reference": ' + json.dumps(reference)
+        return text + "}"
+
+    def validate(self, sections, tokens, delays_between, **kwargs):
+        compiled = self.compile(sections, tokens, **kwargs)
+        issues = []
+        error_count = 0
+
+        def report(issue):
+            nonlocal error_count
+            if issue["severity"] == "error":
+                error_count += 1
+            if len(issues) < MAX_REPORTED_ISSUES:
+                issues.append(issue)
+
+        held = {}
+        section_reports = []
+        total_ms = 0.0
+        max_wait_ms = 0
+        for s_idx, c in enumerate(compiled):
+            for issue in c["issues"]:
+                report(dict(issue, section=s_idx))
+            error_count += c["error_count"] - sum(1 for i in c["issues"] if i["severity"] == "error")
+            for (kind, name), a_idx in c["opens"]:
+                if (kind, name) not in held:
+                    what = repr(name) if kind == "key" else f"mouse {name}"
+                    report({"section": s_idx, "step": a_idx, "severity": "warning", "code": "release_without_press",
+                            "message": f"{what} released but not pressed"})
+            for (kind, name), a_idx in c["first_presses"]:
+                if (kind, name) in held:
+                    report({"section": s_idx, "step": a_idx, "severity": "warning", "code": "repeat_press",
+                            "message": f"{name!r} pressed again while held"})
+            for name, (pressed, a_idx) in c["effects"].items():
+                if pressed:
+                    held[name] = (s_idx, a_idx)
+                else:
+                    held.pop(name, None)
+            summary = dict(c["summary"])
+            summary["held_keys"] = sorted((n for k, n in held if k == "key"), key=str)
+            summary["held_buttons"] = sorted((n for k, n in held if k == "button"), key=str)
+            section_reports.append(summary)
+            total_ms += c["duration_ms"]
+            max_wait_ms += c["max_wait_ms"]
+            if s_idx < len(compiled) - 1:
+                gap = delays_between[s_idx] if s_idx < len(delays_between) else 0
+                if not isinstance(gap, (int, float)) or gap < 0:
+                    report({"section": s_idx, "step": None, "severity": "error", "code": "negative_delay",
+                            "message": f"invalid between-section delay {gap!r}"})
+                else:
+                    total_ms += gap
+        for (kind, name), (s_idx, a_idx) in held.items():
+            if kind == "key":
+                report({"section": s_idx, "step": a_idx, "severity": "error", "code": "stuck_key",
+                        "message": f"{name!r} is pressed but never released"})
+            else:
+                report({"section": s_idx, "step": a_idx, "severity": "error", "code": "stuck_button",
+                        "message": f"mouse {name} is pressed but never released"})
+        return {
+            "ok": error_count == 0,
+            "error_count": error_count,
+            "issues": issues,
+            "duration_ms": total_ms,
+            "max_wait_ms": max_wait_ms,
+            "sections": section_reports,
+        }
+
+    def check(self, sections, tokens, delays_between, **kwargs):
+        report = self.validate(sections, tokens, delays_between, **kwargs)
+        if not report["ok"]:
+            raise MacroValidationError(report)
+        return report
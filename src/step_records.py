@@ -0,0 +1,218 @@
+import json
+import sys
+from collections.abc import Mapping
+
+# Compact, immutable stand-ins for the common step dicts. They read like the
+# dicts they replace (step["key"], step.get("type"), dict(step), ==), so callers
+# need no changes, but a record is a few slots instead of a ~230 byte dict, and
+# delay and key records are shared: a million-step recording holds one
+# {"type": "press", "key": "a"} and one record per distinct delay.
+# Dicts that carry extra keys, keys in another order or unusual values are left
+# alone so saving reproduces them exactly.
+
+MAX_INTERNED_DELAYS = 1 << 16
+
+
+class StepRecord(Mapping):
+    __slots__ = ("_json",)
+    fields = ()
+
+    def __getitem__(self, name):
+        if name in self.fields:
+            return getattr(self, name)
+        raise KeyError(name)
+
+    def get(self, name, default=None):
+        if name in self.fields:
+            return getattr(self, name)
+        return default
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __contains__(self, name):
+        return name in self.fields
+
+    def _values(self):
+        return tuple(getattr(self, name) for name in self.fields)
+
+    def __eq__(self, other):
+        if isinstance(other, StepRecord):
+            return self.fields == other.fields and self._values() == other._values()
+        if isinstance(other, Mapping):
+            return dict(self) == dict(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def __setattr__(self, name, value):
+        if name != "_json" and hasattr(self, "_json"):
+            raise AttributeError("steps are immutable; replace the step instead")
+        object.__setattr__(self, name, value)
+
+    def __reduce__(self):
+        # Unpickled records (e.g. in compile workers) are interned again
+        return compact_step, (dict(self),)
+
+    def json(self):
+        # Same text json.dumps(dict(step)) produces; shared records keep it
+        text = self._json
+        if text is None or text is False:
+            text = json.dumps(dict(self))
+            if self._json is None:
+                object.__setattr__(self, "_json", text)
+        return text
+
+
+class DelayStep(StepRecord):
+    __slots__ = ("delay", "unit")
+    fields = ("type", "delay", "unit")
+    type = "delay"
+
+    def __init__(self, delay, unit, shared=False):
+        object.__setattr__(self, "delay", delay)
+        object.__setattr__(self, "unit", unit)
+        object.__setattr__(self, "_json", None if shared else False)
+
+
+class KeyStep(StepRecord):
+    __slots__ = ("type", "key")
+    fields = ("type", "key")
+
+    def __init__(self, type, key):
+        object.__setattr__(self, "type", type)
+        object.__setattr__(self, "key", key)
+        object.__setattr__(self, "_json", None)
+
+
+class MouseStep(StepRecord):
+    __slots__ = ("type", "x", "y", "button")
+    fields = ("type", "x", "y", "button")
+
+    def __init__(self, type, x, y, button):
+        object.__setattr__(self, "type", type)
+        object.__setattr__(self, "x", x)
+        object.__setattr__(self, "y", y)
+        object.__setattr__(self, "button", button)
+        object.__setattr__(self, "_json", False)
+
+
+class ClickStep(StepRecord):
+    __slots__ = ("x", "y", "button", "hold")
+    fields = ("type", "x", "y", "button", "hold")
+    type = "mouse_click"
+
+    def __init__(self, x, y, button, hold):
+        object.__setattr__(self, "x", x)
+        object.__setattr__(self, "y", y)
+        object.__setattr__(self, "button", button)
+        object.__setattr__(self, "hold", hold)
+        object.__setattr__(self, "_json", False)
+
+
+_delays = {}
+_keys = {}
+
+
+def delay_step(delay, unit="ms"):
+    if type(delay) is not int:
+        return DelayStep(delay, unit)
+    step = _delays.get((delay, unit))
+    if step is None:
+        if len(_delays) >= MAX_INTERNED_DELAYS:
+            return DelayStep(delay, unit)
+        step = _delays[(delay, unit)] = DelayStep(delay, sys.intern(unit), shared=True)
+    return step
+
+
+def key_step(type, key):
+    step = _keys.get((type, key))
+    if step is None:
+        step = _keys[(type, key)] = KeyStep(sys.intern(type), sys.intern(key))
+    return step
+
+
+def mouse_step(type, x, y, button):
+    return MouseStep(sys.intern(type), x, y, sys.intern(button))
+
+
+def click_step(x, y, button, hold):
+    return ClickStep(x, y, sys.intern(button), hold)
+
+
+def _compact_delay(step):
+    if (tuple(step) != DelayStep.fields or type(step["delay"]) not in (int, float)
+            or type(step["unit"]) is not str):
+        return step
+    return delay_step(step["delay"], step["unit"])
+
+
+def _compact_key(step):
+    if tuple(step) != KeyStep.fields or type(step["key"]) is not str:
+        return step
+    return key_step(step["type"], step["key"])
+
+
+def _compact_mouse(step):
+    if (tuple(step) != MouseStep.fields or type(step["x"]) is not int or type(step["y"]) is not int
+            or type(step["button"]) is not str):
+        return step
+    return mouse_step(step["type"], step["x"], step["y"], step["button"])
+
+
+def _compact_click(step):
+    if (tuple(step) != ClickStep.fields or type(step["x"]) is not int or type(step["y"]) is not int
+            or type(step["button"]) is not str or type(step["hold"]) not in (int, float)):
+        return step
+    return click_step(step["x"], step["y"], step["button"], step["hold"])
+
+
+_COMPACTORS = {
+    "delay": _compact_delay,
+    "press": _compact_key,
+    "release": _compact_key,
+    "mouse_press": _compact_mouse,
+    "mouse_release": _compact_mouse,
+    "mouse_click": _compact_click,
+}
+
+
+def compact_step(step):
+    # Also usable as a json object_hook: anything that is not a step comes back as is
+    if type(step) is not dict:
+        return step
+    compact = _COMPACTORS.get(step.get("type"))
+    return step if compact is None else compact(step)
+
+
+def compact_steps(steps):
+    return [compact_step(step) for step in steps]
+
+
+def steps_json(steps):
+    # json.dumps(steps) without the brackets; runs of plain dicts share one dumps call
+    parts = []
+    run = []
+    for step in steps:
+        if type(step) is dict:
+            run.append(step)
+            continue
+        if run:
+            parts.append(json.dumps(run)[1:-1])
+            run = []
+        parts.append(step.json())
+    if run:
+        parts.append(json.dumps(run)[1:-1])
+    return ", ".join(parts)
+
+
+def json_default(obj):
+    if isinstance(obj, StepRecord):
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
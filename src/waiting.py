@@ -0,0 +1,73 @@
+import time
+
+SHORT_WAIT = 0.05  # waits up to 50ms use the high-resolution path
+SPIN_WINDOW = 0.002  # last 2ms of a short wait are busy-waited
+
+
+class Waiter:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.wait_count = 0
+        self.wait_wall = 0.0
+        self.wait_cpu = 0.0
+
+    def wait(self, seconds, stop_event=None):
+        if seconds <= 0:
+            return not (stop_event and stop_event.is_set())
+        start_wall = time.perf_counter()
+        start_cpu = time.thread_time()
+        deadline = start_wall + seconds
+        try:
+            if seconds > SHORT_WAIT:
+                return self._wait_long(seconds, stop_event)
+            return self._wait_short(deadline, stop_event)
+        finally:
+            self.wait_count += 1
+            self.wait_wall += time.perf_counter() - start_wall
+            self.wait_cpu += time.thread_time() - start_cpu
+
+    def _wait_long(self, seconds, stop_event):
+        # The thread stays blocked for the whole wait; the event wakes it on stop
+        if stop_event is None:
+            time.sleep(seconds)
+            return True
+        return not stop_event.wait(seconds)
+
+    def _wait_short(self, deadline, stop_event):
+        coarse = deadline - time.perf_counter() - SPIN_WINDOW
+        if coarse > 0:
+            time.sleep(coarse)
+        while time.perf_counter() < deadline:
+            if stop_event and stop_event.is_set():
+                return False
+        return not (stop_event and stop_event.is_set())
+
+
+class RunStats:
+    def __init__(self, waiter):
+        self.waiter = waiter
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.thread_time()
+        self.result = None
+
+    def finish(self):
+        wall = time.perf_counter() - self._start_wall
+        cpu = time.thread_time() - self._start_cpu
+        w = self.waiter
+        self.result = {
+            "wall_s": wall,
+            "cpu_s": cpu,
+            "waits": w.wait_count,
+            "wait_wall_s": w.wait_wall,
+            "wait_cpu_s": w.wait_cpu,
+            "action_wall_s": max(0.0, wall - w.wait_wall),
+            "action_cpu_s": max(0.0, cpu - w.wait_cpu),
+        }
+        return self.result
+
+
+def format_stats(stats):
+    return (f"Waiting: {stats['wait_wall_s']:.1f} s ({stats['wait_cpu_s'] * 1000:.0f} ms CPU), "
+            f"acting: {stats['action_wall_s']:.1f} s ({stats['action_cpu_s'] * 1000:.0f} ms CPU)")
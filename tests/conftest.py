@@ -0,0 +1,26 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fakes  # noqa: E402
+
+# Always use the fakes, even where the real packages are installed: tests must
+# never move the real mouse, and listeners need no display.
+fakes.install()
+
+import pytest  # noqa: E402
+
+from harness import RecordingHarness  # noqa: E402
+
+
+@pytest.fixture
+def backend():
+    fakes.backend.reset()
+    return fakes.backend
+
+
+@pytest.fixture
+def harness(backend):
+    return RecordingHarness(backend)
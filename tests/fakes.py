@@ -0,0 +1,177 @@
+import enum
+import sys
+import time
+import types
+
+# Stand-ins for pynput and pyautogui so the recorder can be driven without a
+# display, keyboard or mouse. install() must run before any src module is imported.
+
+KEYBOARD_KEYS = (
+    ["\t", "\n", "\r"] + [chr(c) for c in range(32, 127) if not chr(c).isupper()]
+    + ["accept", "add", "alt", "altleft", "altright", "apps", "backspace", "capslock", "clear",
+       "ctrl", "ctrlleft", "ctrlright", "decimal", "del", "delete", "divide", "down", "end", "enter",
+       "esc", "escape", "home", "insert", "left", "multiply", "nexttrack", "numlock", "pagedown",
+       "pageup", "pause", "playpause", "prevtrack", "print", "printscreen", "return", "right",
+       "scrolllock", "separator", "shift", "shiftleft", "shiftright", "space", "subtract", "tab",
+       "up", "volumedown", "volumemute", "volumeup", "win", "winleft", "winright"]
+    + [f"f{n}" for n in range(1, 25)] + [f"num{n}" for n in range(10)]
+)
+
+KEY_NAMES = (
+    "alt", "alt_l", "alt_r", "alt_gr", "backspace", "caps_lock", "cmd", "cmd_l", "cmd_r", "ctrl",
+    "ctrl_l", "ctrl_r", "delete", "down", "end", "enter", "esc", "home", "left", "page_down",
+    "page_up", "right", "shift", "shift_l", "shift_r", "space", "tab", "up", "media_play_pause",
+    "media_volume_mute", "media_volume_down", "media_volume_up", "media_previous", "media_next",
+    "insert", "menu", "num_lock", "pause", "print_screen", "scroll_lock",
+) + tuple(f"f{n}" for n in range(1, 21))
+
+Key = enum.Enum("Key", KEY_NAMES)
+
+
+class Button(enum.Enum):
+    left = 1
+    right = 2
+    middle = 3
+    x1 = 4
+
+
+class KeyCode:
+    def __init__(self, vk=None, char=None):
+        self.vk = vk
+        self.char = char
+
+    @classmethod
+    def from_char(cls, char):
+        return cls(char=char)
+
+    @classmethod
+    def from_vk(cls, vk):
+        return cls(vk=vk)
+
+    def __eq__(self, other):
+        return isinstance(other, KeyCode) and (self.vk, self.char) == (other.vk, other.char)
+
+    def __hash__(self):
+        return hash((self.vk, self.char))
+
+    def __repr__(self):
+        return repr(self.char) if self.char is not None else f"<{self.vk}>"
+
+
+class FakeListener:
+    # Never spawns a thread; the harness calls the callbacks itself
+    def __init__(self, **callbacks):
+        self.callbacks = callbacks
+        self.running = False
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+
+class FakeImage:
+    def __init__(self, pixel):
+        self.pixel = pixel
+
+    def getpixel(self, xy):
+        return self.pixel
+
+    def convert(self, mode):
+        return self
+
+
+class FakeWindow:
+    def __init__(self, title, left, top, width, height):
+        self.title = title
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+
+
+class FakeBackend:
+    # Records every output call as (virtual ms, name, *args)
+    class ImageNotFoundException(Exception):
+        pass
+
+    KEYBOARD_KEYS = KEYBOARD_KEYS
+    PAUSE = 0
+    FAILSAFE = False
+
+    def __init__(self):
+        self.clock = time.monotonic
+        self.reset()
+
+    def reset(self):
+        self.events = []
+        self.pixels = {}
+        self.screen_size = (1920, 1080)
+        self.windows = []  # first one is the active and topmost window
+        self.on_event = None
+
+    def _record(self, name, *args):
+        self.events.append((round(self.clock() * 1000), name) + args)
+        if self.on_event:
+            self.on_event(self.events[-1])
+
+    def calls(self, *names):
+        # Events without their timestamps, optionally limited to some names
+        return [e[1:] for e in self.events if not names or e[1] in names]
+
+    def keyDown(self, key):
+        self._record("keyDown", key)
+
+    def keyUp(self, key):
+        self._record("keyUp", key)
+
+    def write(self, text, interval=0.0):
+        self._record("write", text, interval)
+
+    def moveTo(self, x, y):
+        self._record("moveTo", x, y)
+
+    def mouseDown(self, button="left"):
+        self._record("mouseDown", button)
+
+    def mouseUp(self, button="left"):
+        self._record("mouseUp", button)
+
+    def size(self):
+        return self.screen_size
+
+    def screenshot(self, region=None):
+        x, y = (region or (0, 0))[:2]
+        return FakeImage(self.pixels.get((x, y), (0, 0, 0)))
+
+    def getActiveWindow(self):
+        return self.windows[0] if self.windows else None
+
+    def getWindowsWithTitle(self, title):
+        return [w for w in self.windows if title in w.title]
+
+    def getWindowsAt(self, x, y):
+        return [w for w in self.windows
+                if w.left <= x < w.left + w.width and w.top <= y < w.top + w.height]
+
+    def locate(self, needle, haystack):
+        raise self.ImageNotFoundException()
+
+
+backend = FakeBackend()
+
+
+def install():
+    pynput = types.ModuleType("pynput")
+    keyboard = types.ModuleType("pynput.keyboard")
+    keyboard.Key = Key
+    keyboard.KeyCode = KeyCode
+    keyboard.Listener = FakeListener
+    mouse = types.ModuleType("pynput.mouse")
+    mouse.Button = Button
+    mouse.Listener = FakeListener
+    pynput.keyboard = keyboard
+    pynput.mouse = mouse
+    sys.modules.update({"pynput": pynput, "pynput.keyboard": keyboard, "pynput.mouse": mouse,
+                        "pyautogui": backend})
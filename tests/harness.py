@@ -0,0 +1,137 @@
+import itertools
+
+from fakes import Button, FakeListener, Key, KeyCode
+from macro_recorder import MacroRecorderCore
+
+
+class VirtualClock:
+    def __init__(self, start_ms=0):
+        self.now = start_ms / 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def set_ms(self, ms):
+        self.now = ms / 1000.0
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class TickingClock:
+    # Moves forward a fixed step on every read; safe to share between threads
+    def __init__(self, step_ms=1):
+        self._ticks = itertools.count()
+        self.step = step_ms / 1000.0
+
+    def __call__(self):
+        return next(self._ticks) * self.step
+
+
+class VirtualWaiter:
+    # Same interface as waiting.Waiter, but waits only move the virtual clock
+    def __init__(self, clock):
+        self.clock = clock
+        self.reset()
+
+    def reset(self):
+        self.wait_count = 0
+        self.wait_wall = 0.0
+        self.wait_cpu = 0.0
+
+    def wait(self, seconds, stop_event=None):
+        if seconds <= 0:
+            return not (stop_event and stop_event.is_set())
+        self.wait_count += 1
+        if stop_event and stop_event.is_set():
+            return False
+        self.clock.advance(seconds)
+        self.wait_wall += seconds
+        return not (stop_event and stop_event.is_set())
+
+
+def key_for(name):
+    if isinstance(name, (Key, KeyCode)):
+        return name
+    if len(name) == 1:
+        return KeyCode.from_char(name)
+    if name.startswith("<") and name.endswith(">"):
+        return KeyCode.from_vk(int(name[1:-1]))
+    return Key[name]
+
+
+# Script builders. A script is a list of (at_ms, kind, *args) with kind one of
+# press/release (key name) or mouse_press/mouse_release (x, y, button name).
+
+def tap(key, at, hold=50):
+    return [(at, "press", key), (at + hold, "release", key)]
+
+
+def typed(text, at, hold=40, gap=60):
+    script = []
+    for char in text:
+        script += tap(" " if char == " " else char, at, hold)
+        at += hold + gap
+    return script
+
+
+def click(x, y, at, hold=80, button="left"):
+    return [(at, "mouse_press", x, y, button), (at + hold, "mouse_release", x, y, button)]
+
+
+class RecordingHarness:
+    def __init__(self, backend, clock=None):
+        self.clock = clock or VirtualClock()
+        self.backend = backend
+        backend.reset()
+        backend.clock = self.clock
+        self.listeners = []
+        r = self.recorder = MacroRecorderCore()
+        r.clock = self.clock
+        r.playback_clock = self.clock
+        r.keyboard_listener_factory = self._listener
+        r.mouse_listener_factory = self._listener
+        r.backend = backend
+        r.waiter_factory = lambda: VirtualWaiter(self.clock)
+
+    def _listener(self, **callbacks):
+        listener = FakeListener(**callbacks)
+        self.listeners.append(listener)
+        return listener
+
+    def _callback(self, name):
+        for listener in reversed(self.listeners):
+            if name in listener.callbacks:
+                assert listener.running, f"{name} listener is not running"
+                return listener.callbacks[name]
+        raise AssertionError(f"no listener for {name}")
+
+    def dispatch(self, kind, *args):
+        if kind == "press":
+            self._callback("on_press")(key_for(args[0]))
+        elif kind == "release":
+            self._callback("on_release")(key_for(args[0]))
+        elif kind in ("mouse_press", "mouse_release"):
+            x, y, button = args
+            self._callback("on_click")(x, y, Button[button], kind == "mouse_press")
+        else:
+            raise ValueError(kind)
+
+    def feed(self, script):
+        for event in script:
+            if isinstance(self.clock, VirtualClock):
+                self.clock.set_ms(event[0])
+            self.dispatch(*event[1:])
+
+    def record(self, script, section=None, start_ms=0, stop_ms=None):
+        # Records the script into a section (a new one by default) and returns its steps
+        if section is None:
+            section = self.recorder.add_section()
+        if isinstance(self.clock, VirtualClock):
+            self.clock.set_ms(start_ms)
+        self.recorder.start_recording(section)
+        self.feed(script)
+        if stop_ms is not None and isinstance(self.clock, VirtualClock):
+            self.clock.set_ms(stop_ms)
+        self.recorder.stop_recording()
+        return self.recorder.snapshot_sections()[section]["steps"]
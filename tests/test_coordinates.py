@@ -0,0 +1,124 @@
+import json
+
+import pytest
+
+import coordinate_transform
+from coordinate_transform import IDENTITY, CoordinateMapper, map_points, map_steps, transform_between
+from fakes import FakeWindow
+from harness import click, tap
+
+
+def clicks(backend):
+    return [e[1:] for e in backend.calls("moveTo")]
+
+
+def test_absolute_by_default(harness, backend):
+    harness.record(click(100, 200, 10) + tap("a", 300))
+    assert harness.recorder.reference is None
+    backend.reset()
+    backend.screen_size = (1280, 720)
+    harness.recorder.play_all()
+    assert clicks(backend) == [(100, 200)]
+
+
+def test_screen_reference_scales_to_smaller_screen(harness, backend, tmp_path):
+    harness.recorder.relative_coordinates = "screen"
+    harness.record(click(960, 540, 10) + click(1919, 0, 300) + tap("a", 600))
+    assert harness.recorder.reference == {"kind": "screen", "screen": [1920, 1080], "rect": [0, 0, 1920, 1080]}
+
+    path = tmp_path / "macro.json"
+    harness.recorder.save_macro(str(path))
+    assert json.loads(path.read_text())["reference"] == harness.recorder.reference
+    harness.recorder.clear_all()
+    harness.recorder.load_macro(str(path), validate=True)
+
+    backend.reset()
+    backend.screen_size = (1280, 720)
+    harness.recorder.play_all()
+    assert clicks(backend) == [(640, 360), (1279, 0)]
+
+
+def test_window_reference_follows_the_window(harness, backend):
+    # The macro editor is the active window when recording starts and replays
+    backend.windows = [FakeWindow("Macro Editor", 1000, 0, 400, 300), FakeWindow("Editor - notes.txt", 100, 50, 800, 600)]
+    harness.recorder.relative_coordinates = "window"
+    harness.record(tap("a", 10) + click(500, 350, 300) + tap("b", 600))
+    assert harness.recorder.reference["rect"] == [100, 50, 800, 600]
+    assert harness.recorder.reference["title"] == "Editor - notes.txt"
+
+    backend.reset()
+    backend.windows = [FakeWindow("Macro Editor", 1000, 0, 400, 300), FakeWindow("Editor - notes.txt", 300, 150, 400, 300)]
+    harness.recorder.play_all()
+    assert clicks(backend) == [(500, 300)]
+
+
+def test_window_reference_by_title(harness, backend):
+    backend.windows = [FakeWindow("Macro Editor", 0, 0, 400, 300), FakeWindow("Game", 400, 0, 800, 600)]
+    harness.recorder.relative_coordinates = "window"
+    harness.recorder.reference_window_title = "Game"
+    harness.record(click(200, 100, 10) + tap("a", 300))
+    assert harness.recorder.reference["rect"] == [400, 0, 800, 600]
+
+
+def test_missing_window_keeps_its_place_on_screen(harness, backend):
+    backend.windows = [FakeWindow("App", 960, 0, 960, 540)]
+    harness.recorder.relative_coordinates = "window"
+    harness.record(click(1440, 270, 10) + tap("a", 300))
+    backend.reset()
+    backend.screen_size = (960, 540)
+    harness.recorder.play_all()
+    assert clicks(backend) == [(720, 135)]
+
+
+def test_recording_more_maps_into_the_reference(harness, backend):
+    r = harness.recorder
+    r.load_data({"sections": [{"name": "s", "steps": []}],
+                 "reference": coordinate_transform.screen_reference((3840, 2160))})
+    harness.record(click(960, 540, 10) + tap("a", 300), section=0)
+    assert r.snapshot_sections()[0]["steps"][1]["x"] == 1920
+    assert r.validate()["ok"]
+
+
+def test_replay_target_and_held_button(harness, backend):
+    harness.recorder.relative_coordinates = "screen"
+    harness.record(click(200, 100, 10, hold=900) + tap("a", 1000))
+    harness.recorder.replay_target = [1920, 0, 960, 540]
+    backend.reset()
+    harness.recorder.play_from(0, 2)
+    assert backend.calls()[:2] == [("moveTo", 2020, 50), ("mouseDown", "left")]
+
+
+def test_wait_steps_are_mapped():
+    t = transform_between((0, 0, 200, 100), (10, 10, 100, 50))
+    steps = [{"type": "wait_pixel", "x": 100, "y": 50, "color": [1, 2, 3]},
+             {"type": "wait_image", "template": "t.png", "region": [0, 0, 200, 100]},
+             {"type": "delay", "delay": 5, "unit": "ms"}]
+    mapped = map_steps(steps, t)
+    assert mapped[0] == {"type": "wait_pixel", "x": 60, "y": 35, "color": [1, 2, 3]}
+    assert mapped[1]["region"] == [10, 10, 100, 50]
+    assert mapped[2] is steps[2]
+    assert steps[0]["x"] == 100
+
+
+def test_mapped_sections_are_cached_per_transform():
+    mapper = CoordinateMapper()
+    sections = [{"name": "s", "steps": [{"type": "mouse_press", "x": 4, "y": 4, "button": "left"}]}]
+    half = transform_between((0, 0, 100, 100), (0, 0, 50, 50))
+    first = mapper.map_sections(sections, [7], half)
+    assert mapper.map_sections(sections, [7], half)[0]["steps"] is first[0]["steps"]
+    assert mapper.map_sections(sections, [7], IDENTITY) is sections
+    assert first[0]["steps"][0]["x"] == 2
+
+
+def test_vectorized_points_match_plain_python():
+    pytest.importorskip("numpy")
+    t = transform_between((13, 7, 1920, 1080), (0, 0, 1366, 768))
+    points = [(x, (x * 7) % 1080) for x in range(0, 1920, 3)]
+    numpy_result = [tuple(p) for p in map_points(points, t)]
+    plain = [t.apply(x, y) for x, y in points]
+    assert numpy_result == plain
+
+
+def test_bad_reference_is_rejected(harness):
+    with pytest.raises(ValueError):
+        harness.recorder.load_data({"sections": [], "reference": {"kind": "screen", "screen": [0, 0]}})
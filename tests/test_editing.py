@@ -0,0 +1,132 @@
+import itertools
+import json
+import random
+
+import coordinate_transform
+import section_pipeline
+from harness import tap
+from macro_validator import validate_macro
+from section_pipeline import SectionPipeline
+
+
+def keys(steps):
+    return [(s["type"], s.get("key")) for s in steps if s["type"] != "delay"]
+
+
+def test_delete_middle_section_merges_gaps(harness):
+    r = harness.recorder
+    for name in ("a", "b", "c"):
+        r.add_section(name)
+    r.set_between_delay(0, 100)
+    r.set_between_delay(1, 250)
+    r.delete_section(1)
+    assert [s["name"] for s in r.snapshot_sections()] == ["a", "c"]
+    assert r.snapshot_between_delays() == [350]
+
+
+def test_step_moves_and_delay_edit(harness):
+    steps = harness.record(tap("a", 100) + tap("b", 300))
+    r = harness.recorder
+    before, _gaps, _revision, _tokens = r.frozen_snapshot()
+    r.move_step_down(0, 1)
+    r.block_move_up(0, 5, 7)
+    r.edit_delay(0, 0, 40)
+    r.delete_step(0, len(steps) - 1)
+    after = r.snapshot_sections()[0]["steps"]
+    assert before[0]["steps"] == steps
+    assert [s["type"] for s in after] == ["delay", "delay", "press", "release", "press", "delay", "release"]
+    assert after[0] == {"type": "delay", "delay": 40, "unit": "ms"}
+    assert keys(after) == [("press", "a"), ("release", "a"), ("press", "b"), ("release", "b")]
+
+
+def test_durations_follow_edits(harness):
+    harness.record(tap("a", 100, hold=50))
+    r = harness.recorder
+    assert r.macro_duration_ms() == 150
+    r.edit_delay(0, 2, 500)
+    assert r.macro_duration_ms() == 600
+    assert r.step_offset_ms(0, 3) == 600
+    r.add_section()
+    r.add_delay_step(1, 70)
+    r.set_between_delay(0, 30)
+    assert r.macro_duration_ms() == 700
+
+
+def test_section_reorder_keeps_recording_target(harness):
+    r = harness.recorder
+    r.add_section("first")
+    second = r.add_section("second")
+    r.start_recording(second)
+    r.move_section_left(second)
+    harness.feed(tap("z", 10))
+    r.stop_recording()
+    sections = r.snapshot_sections()
+    assert sections[0]["name"] == "second"
+    assert keys(sections[0]["steps"]) == [("press", "z"), ("release", "z")]
+
+
+def test_save_and_load_round_trip(harness, tmp_path):
+    harness.record(tap("a", 100))
+    harness.record(tap("b", 200))
+    r = harness.recorder
+    r.set_between_delay(0, 1000)
+    hashes = r.section_hashes()
+    path = tmp_path / "macro.json"
+    r.save_macro(str(path))
+    data = json.loads(path.read_text())
+    assert data == {"sections": r.snapshot_sections(), "delays_between": [1000]}
+
+    r.clear_all()
+    r.load_macro(str(path), validate=True)
+    assert r.section_hashes() == hashes
+    assert r.macro_duration_ms() == 1000 + 150 + 250
+
+
+def ordered(issues):
+    return sorted(issues, key=lambda i: (i["section"], i["step"], i["code"], i["message"]))
+
+
+def test_pipeline_matches_whole_macro_validation():
+    rng = random.Random(7)
+    pipeline = SectionPipeline()
+    ids = itertools.count()
+    kinds = ["press", "release", "mouse_press", "mouse_release", "delay"]
+    for _ in range(200):
+        sections = []
+        for _ in range(rng.randint(1, 4)):
+            steps = []
+            for _ in range(rng.randint(0, 6)):
+                t = rng.choice(kinds)
+                if t == "delay":
+                    steps.append({"type": t, "delay": rng.randint(0, 50), "unit": "ms"})
+                elif t in ("press", "release"):
+                    steps.append({"type": t, "key": rng.choice("ab")})
+                else:
+                    steps.append({"type": t, "x": 5, "y": 5, "button": rng.choice(["left", "right"])})
+            sections.append({"name": "s", "steps": steps})
+        gaps = [rng.randint(0, 20) for _ in sections[1:]]
+        tokens = [next(ids) for _ in sections]
+        combined = pipeline.validate(sections, tokens, gaps, screen_size=(100, 100))
+        whole = validate_macro(sections, gaps, screen_size=(100, 100))
+        assert ordered(combined["issues"]) == ordered(whole["issues"])
+        assert combined["sections"] == whole["sections"]
+        assert (combined["ok"], combined["error_count"]) == (whole["ok"], whole["error_count"])
+
+
+def test_saving_does_not_recompile_validated_sections(harness, tmp_path, monkeypatch):
+    r = harness.recorder
+    r.load_data({"sections": [{"name": str(i), "steps": [{"type": "delay", "delay": 5, "unit": "ms"}]}
+                              for i in range(5)],
+                 "reference": coordinate_transform.screen_reference((3840, 2160))})
+    compiled = []
+    compile_section = section_pipeline.compile_section
+    monkeypatch.setattr(section_pipeline, "compile_section", lambda *a: compiled.append(a) or compile_section(*a))
+    for _ in range(3):
+        assert r.validate()["ok"]
+        r.save_macro(str(tmp_path / "macro.json"))
+        r.section_hashes()
+    assert len(compiled) == 5
+    r.edit_delay(2, 0, 9)
+    r.validate()
+    r.save_macro(str(tmp_path / "macro.json"))
+    assert len(compiled) == 6
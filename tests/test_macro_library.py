@@ -0,0 +1,52 @@
+import json
+import os
+
+import pytest
+
+from macro_library import MacroLibrary
+
+
+def macro(*keys):
+    steps = [{"type": t, "key": k} for k in keys for t in ("press", "release")]
+    return {"sections": [{"name": "s", "steps": steps}], "delays_between": []}
+
+
+def write(path, data, mtime):
+    path.write_text(json.dumps(data))
+    os.utime(path, (mtime, mtime))
+
+
+def keys(loaded):
+    return [s["key"] for s in loaded["sections"][0]["steps"]][::2]
+
+
+def test_load_sees_files_changed_after_refresh(tmp_path):
+    library = MacroLibrary(str(tmp_path))
+    write(tmp_path / "one.json", macro("a"), 1000)
+    library.refresh()
+    assert keys(library.load("one")) == ["a"]
+
+    # Rewritten by another process: the cached copy must not be served
+    write(tmp_path / "one.json", macro("b", "c"), 2000)
+    assert keys(library.load("one")) == ["b", "c"]
+    assert library.entries()[0]["step_count"] == 4
+
+    # Added after the last refresh
+    write(tmp_path / "two.json", macro("d"), 3000)
+    assert keys(library.load("two")) == ["d"]
+    assert [e["name"] for e in MacroLibrary(str(tmp_path)).entries()] == ["one", "two"]
+
+    os.remove(tmp_path / "one.json")
+    with pytest.raises(KeyError):
+        library.load("one")
+    assert [e["name"] for e in library.entries()] == ["two"]
+
+
+def test_unchanged_files_come_from_the_cache(tmp_path):
+    library = MacroLibrary(str(tmp_path))
+    library.add("one", macro("a"), tags=["x"])
+    first = library.load("one")
+    assert library.load("one")["sections"][0]["steps"][0] is first["sections"][0]["steps"][0]
+    write(tmp_path / "one.json", macro("b"), 5000)
+    assert keys(library.load("one")) == ["b"]
+    assert library.entries()[0]["tags"] == ["x"]
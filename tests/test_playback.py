@@ -0,0 +1,214 @@
+import threading
+
+import pytest
+
+import macro_timeline
+from harness import click, tap, typed
+from macro_validator import MacroValidationError
+
+
+def test_replay_matches_recorded_timing(harness, backend):
+    harness.record(tap("a", 100, hold=50) + tap("enter", 400, hold=30))
+    backend.reset()
+    harness.clock.set_ms(10000)
+    harness.recorder.play_all()
+    assert backend.events == [(10100, "keyDown", "a"), (10150, "keyUp", "a"),
+                              (10400, "keyDown", "enter"), (10430, "keyUp", "enter")]
+
+
+def test_special_keys_replay_through_backend_names(harness, backend):
+    harness.record([(10, "press", "ctrl_l"), (20, "press", "<96>"), (30, "release", "<96>"),
+                    (40, "release", "ctrl_l")])
+    backend.reset()
+    harness.recorder.play_all()
+    assert backend.calls() == [("keyDown", "ctrlleft"), ("keyDown", "num0"), ("keyUp", "num0"), ("keyUp", "ctrlleft")]
+
+
+def test_click_replays_with_hold(harness, backend):
+    harness.record(click(30, 40, 100, hold=70) + tap("a", 300))
+    backend.reset()
+    harness.clock.set_ms(0)
+    harness.recorder.play_all()
+    assert backend.events[:3] == [(100, "moveTo", 30, 40), (100, "mouseDown", "left"), (170, "mouseUp", "left")]
+
+
+def test_steady_typing_replays_as_one_write(harness, backend):
+    harness.recorder.coalesce_typing = True
+    harness.record(typed("hello", 100, hold=40, gap=60) + tap("enter", 1000))
+    backend.reset()
+    harness.recorder.play_all()
+    assert backend.calls()[0] == ("write", "hello", 0.1)
+
+
+def test_uneven_typing_replays_per_character(harness, backend):
+    harness.recorder.coalesce_typing = True
+    script = tap("o", 100, hold=40) + tap("k", 180, hold=200) + tap("x", 600) + tap("enter", 1000)
+    harness.record(script)
+    backend.reset()
+    harness.clock.set_ms(0)
+    harness.recorder.play_all()
+    assert backend.events[:4] == [(100, "keyDown", "o"), (140, "keyUp", "o"), (180, "keyDown", "k"), (380, "keyUp", "k")]
+
+
+def test_gap_between_sections(harness, backend):
+    harness.record(tap("a", 10, hold=10))
+    harness.record(tap("b", 10, hold=10))
+    harness.recorder.set_between_delay(0, 500)
+    backend.reset()
+    harness.clock.set_ms(0)
+    harness.recorder.play_all()
+    assert [e[0] for e in backend.events] == [10, 20, 530, 540]
+    assert harness.recorder.macro_duration_ms() == 540
+
+
+def test_stop_and_resume_releases_and_restores_held_keys(harness, backend):
+    script = [(10, "press", "shift"), (20, "press", "a"), (30, "release", "a"),
+              (40, "press", "b"), (50, "release", "b"), (60, "release", "shift")]
+    harness.record(script)
+    backend.reset()
+    stop = threading.Event()
+    backend.on_event = lambda event: event[1:] == ("keyDown", "a") and stop.set()
+    harness.recorder.play_all(stop)
+    assert harness.recorder.checkpoint == {"section": 0, "step": 4}
+    assert backend.calls() == [("keyDown", "shift"), ("keyDown", "a"), ("keyUp", "shift"), ("keyUp", "a")]
+
+    backend.reset()
+    harness.recorder.resume()
+    assert backend.calls() == [("keyDown", "shift"), ("keyDown", "a"), ("keyUp", "a"), ("keyDown", "b"),
+                               ("keyUp", "b"), ("keyUp", "shift")]
+
+
+def test_checkpoint_is_dropped_when_the_macro_changes(harness, backend):
+    r = harness.recorder
+    harness.record(tap("a", 10) + tap("b", 100) + tap("c", 200))
+    stop = threading.Event()
+
+    def interrupt():
+        stop.clear()
+        backend.reset()
+        backend.on_event = lambda event: event[1:] == ("keyDown", "b") and stop.set()
+        r.play_all(stop)
+        backend.on_event = None
+        assert r.checkpoint == {"section": 0, "step": 6}
+
+    interrupt()
+    r.edit_delay(0, 8, 30)
+    r.add_section()
+    assert r.checkpoint == {"section": 0, "step": 6}
+    r.edit_delay(0, 4, 30)
+    assert r.checkpoint is None
+
+    interrupt()
+    r.move_section_right(0)
+    assert r.checkpoint is None
+    r.move_section_left(1)
+
+    interrupt()
+    r.clear_all()
+    assert r.checkpoint is None
+    backend.reset()
+    r.resume()
+    assert backend.calls() == []
+
+    harness.record(tap("a", 10) + tap("b", 100) + tap("c", 200))
+    interrupt()
+    r.load_data({"sections": [{"name": "other", "steps": [{"type": "type_text", "text": "xyz", "timing": []}]}]})
+    assert r.checkpoint is None
+
+
+def test_stop_inside_typed_text_resumes_with_the_rest(harness, backend):
+    harness.recorder.coalesce_typing = True
+    script = tap("o", 100, hold=40) + tap("k", 180, hold=200) + tap("x", 600) + tap("y", 700) + tap("enter", 1000)
+    harness.record(script)
+    backend.reset()
+    stop = threading.Event()
+    backend.on_event = lambda event: event[1:] == ("keyDown", "k") and stop.set()
+    harness.recorder.play_all(stop)
+    assert harness.recorder.checkpoint == {"section": 0, "step": 1, "char": 2}
+    assert backend.calls() == [("keyDown", "o"), ("keyUp", "o"), ("keyDown", "k"), ("keyUp", "k")]
+
+    backend.reset()
+    backend.on_event = None
+    harness.recorder.resume()
+    assert [c[1] for c in backend.calls("keyDown")] == ["x", "y", "enter"]
+    assert harness.recorder.checkpoint is None
+
+
+def test_stop_inside_batched_text(harness, backend):
+    harness.recorder.coalesce_typing = True
+    harness.record(typed("hello world", 100, hold=40, gap=60) + tap("enter", 2000))
+    backend.reset()
+    stop = threading.Event()
+    backend.on_event = lambda event: event[1] == "write" and stop.set()
+    harness.recorder.play_all(stop)
+    # 100 ms per character: 250 ms chunks of two characters
+    assert backend.calls() == [("write", "he", 0.1)]
+    assert harness.recorder.checkpoint == {"section": 0, "step": 1, "char": 2}
+
+    backend.reset()
+    backend.on_event = None
+    harness.recorder.resume(threading.Event())
+    assert "".join(c[1] for c in backend.calls("write")) == "llo world"
+
+
+def test_play_from_restores_held_button(harness, backend):
+    harness.record(click(7, 8, 10, hold=900) + tap("a", 1000))
+    backend.reset()
+    harness.recorder.play_from(0, 2)
+    assert backend.calls()[:4] == [("moveTo", 7, 8), ("mouseDown", "left"), ("moveTo", 7, 8),
+                                    ("mouseUp", "left")]
+
+
+def test_wait_pixel_polls_on_the_virtual_clock(harness, backend):
+    section = harness.recorder.add_section()
+    harness.recorder.add_wait_step(section, {"type": "wait_pixel", "x": 5, "y": 5, "color": [255, 0, 0],
+                                             "timeout": 2000, "poll": 100})
+    harness.clock.set_ms(0)
+    backend.on_event = None
+    harness.recorder.play_all()
+    assert harness.clock() >= 2.0
+    assert harness.recorder.last_run_stats["waits"] == 20
+
+    backend.pixels[(5, 5)] = (255, 0, 0)
+    harness.clock.set_ms(0)
+    harness.recorder.play_all()
+    assert harness.clock() == 0
+
+
+def test_validation_blocks_playback(harness, backend):
+    harness.record([(10, "press", "a")])
+    backend.reset()
+    with pytest.raises(MacroValidationError) as info:
+        harness.recorder.play_all(validate=True)
+    assert info.value.report["issues"][0]["code"] == "stuck_key"
+    assert backend.events == []
+
+
+def test_sections_of_whole_checkpoint_blocks(harness, backend, monkeypatch):
+    monkeypatch.setattr(macro_timeline, "CHECKPOINT_STEPS", 4)
+    r = harness.recorder
+    steps = [{"type": "press", "key": "shift"}] + [{"type": "delay", "delay": 10, "unit": "ms"}] * 3
+    r.load_data({"sections": [{"name": "s", "steps": steps}, {"name": "t", "steps": [{"type": "release", "key": "shift"}]}],
+                 "delays_between": [100]})
+    assert r.macro_duration_ms() == 130
+    r.add_delay_step(0, 5)
+    assert r.macro_duration_ms() == 135
+    r.delete_step(0, 4)
+
+    # Stopped in the gap after the section: the checkpoint is step == len(steps)
+    stop = threading.Event()
+    waiter_factory = r.waiter_factory
+
+    def stopping_waiter():
+        waiter = waiter_factory()
+        wait = waiter.wait
+        waiter.wait = lambda seconds, stop_event=None: (seconds == 0.1 and stop.set()) or wait(seconds, stop_event)
+        return waiter
+    r.waiter_factory = stopping_waiter
+    backend.reset()
+    r.play_all(stop)
+    assert r.checkpoint == {"section": 0, "step": 4}
+    backend.reset()
+    r.waiter_factory = waiter_factory
+    r.resume()
+    assert backend.calls() == [("keyDown", "shift"), ("keyUp", "shift")]
@@ -0,0 +1,121 @@
+import key_mapping
+from harness import click, tap, typed
+
+
+def delay(ms):
+    return {"type": "delay", "delay": ms, "unit": "ms"}
+
+
+def test_key_taps_record_exact_delays(harness):
+    steps = harness.record(tap("a", 100, hold=50) + tap("b", 400, hold=30))
+    assert steps == [
+        delay(100), {"type": "press", "key": "a"}, delay(50), {"type": "release", "key": "a"},
+        delay(250), {"type": "press", "key": "b"}, delay(30), {"type": "release", "key": "b"},
+    ]
+
+
+def test_special_keys_are_stored_by_name(harness):
+    script = [(10, "press", "ctrl_l"), (20, "press", "\x01"), (30, "release", "\x01"),
+              (40, "release", "ctrl_l"), (50, "press", "<96>"), (60, "release", "<96>")]
+    steps = harness.record(script)
+    assert [s.get("key") for s in steps if s["type"] != "delay"] == ["ctrl_l", "a", "a", "ctrl_l", "<96>", "<96>"]
+
+
+def test_control_chars_keep_whitespace_keys():
+    assert [key_mapping.backend_key(c) for c in "\t\n\r"] == ["\t", "\n", "\r"]
+    assert key_mapping.backend_key("\x01") == "a"
+
+
+def test_recorded_keys_pass_the_load_gate(harness, tmp_path):
+    script = ([(10, "press", "ctrl_l")] + tap("<49>", 20) + tap("<65>", 100) + tap("<186>", 180)
+              + [(260, "release", "ctrl_l")] + tap("é", 300) + tap("<255>", 400) + tap("b", 500))
+    steps = harness.record(script)
+    assert [s.get("key") for s in steps if s["type"] != "delay"] == [
+        "ctrl_l", "<49>", "<49>", "<65>", "<65>", "<186>", "<186>", "ctrl_l", "b", "b"]
+    assert harness.recorder.skipped_keys == {"é", "<255>"}
+    path = tmp_path / "macro.json"
+    harness.recorder.save_macro(str(path))
+    harness.recorder.load_macro(str(path))
+    assert harness.recorder.snapshot_sections()[0]["steps"] == steps
+    assert [key_mapping.backend_key(k) for k in ("<49>", "<65>", "<186>")] == ["1", "a", ";"]
+
+
+def test_auto_repeat_records_one_press(harness):
+    script = [(10, "press", "x"), (40, "press", "x"), (70, "press", "x"), (100, "release", "x")]
+    steps = harness.record(script)
+    assert [s["type"] for s in steps] == ["delay", "press", "delay", "release"]
+    assert steps[2]["delay"] == 90
+
+
+def test_release_without_press_is_ignored(harness):
+    steps = harness.record([(10, "release", "q")] + tap("w", 20))
+    assert [s.get("key") for s in steps if s["type"] != "delay"] == ["w", "w"]
+
+
+def test_mouse_press_and_release_collapse_to_click(harness):
+    steps = harness.record(click(10, 20, 100, hold=80) + tap("a", 300))
+    assert steps[:3] == [delay(100), {"type": "mouse_click", "x": 10, "y": 20, "button": "left", "hold": 80}, delay(120)]
+
+
+def test_stop_click_is_trimmed(harness):
+    steps = harness.record(tap("a", 100) + click(500, 500, 400))
+    assert [s["type"] for s in steps] == ["delay", "press", "delay", "release"]
+
+
+def test_stop_click_still_held_is_trimmed(harness):
+    r = harness.recorder
+    section = r.add_section()
+    r.start_recording(section)
+    harness.feed(tap("a", 100) + [(400, "mouse_press", 500, 500, "left")])
+    assert r.timeline.section_offsets(section, r.sections[section]["steps"])[-1] == 400
+    r.stop_recording()
+    steps = r.snapshot_sections()[section]["steps"]
+    assert [s["type"] for s in steps] == ["delay", "press", "delay", "release"]
+    assert r.timeline.section_offsets(section, steps)[-1] == 150
+
+
+def test_contact_bounce_is_dropped(harness):
+    script = click(10, 10, 100, hold=40) + click(11, 10, 150, hold=5) + tap("a", 400)
+    steps = harness.record(script)
+    assert [s["type"] for s in steps] == ["delay", "mouse_click", "delay", "press", "delay", "release"]
+    assert harness.recorder.input_filter.dropped > 0
+
+
+def test_long_press_is_kept_as_press_and_release(harness):
+    steps = harness.record(click(5, 5, 100, hold=900, button="right") + tap("a", 1200))
+    assert [s["type"] for s in steps[:4]] == ["delay", "mouse_press", "delay", "mouse_release"]
+    assert steps[2]["delay"] == 900
+
+
+def test_typing_is_coalesced_into_type_text(harness):
+    harness.recorder.coalesce_typing = True
+    steps = harness.record(typed("hi you", 100, hold=40, gap=60) + tap("enter", 1000))
+    assert steps[0] == delay(100)
+    assert steps[1]["type"] == "type_text"
+    assert steps[1]["text"] == "hi you"
+    assert steps[1]["timing"] == [40, 60] * 5 + [40]
+    assert steps[-3:] == [{"type": "press", "key": "enter"}, delay(50), {"type": "release", "key": "enter"}]
+
+
+def test_typing_run_breaks_on_modifier(harness):
+    harness.recorder.coalesce_typing = True
+    script = typed("ab", 10) + [(300, "press", "shift"), (310, "press", "c"), (320, "release", "c"),
+                               (330, "release", "shift")]
+    steps = harness.record(script)
+    assert steps[1]["text"] == "ab"
+    assert [s.get("key") for s in steps[2:] if s["type"] != "delay"] == ["shift", "c", "c", "shift"]
+
+
+def test_recording_into_second_section(harness):
+    first = harness.recorder.add_section("one")
+    harness.record(tap("a", 10), section=first)
+    second = harness.recorder.add_section("two")
+    steps = harness.record(tap("b", 10), section=second)
+    assert steps[1] == {"type": "press", "key": "b"}
+    assert harness.recorder.snapshot_sections()[0]["steps"][1] == {"type": "press", "key": "a"}
+
+
+def test_listeners_stop_with_recording(harness):
+    harness.record(tap("a", 10))
+    assert harness.listeners and not any(listener.running for listener in harness.listeners)
+    assert not harness.recorder.recording
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import threading
+
+from harness import tap
+from remote_control import RemoteControlServer
+
+TIMEOUT = 10
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def request(self, **request):
+        self.writer.write((json.dumps(request) + "\n").encode("utf-8"))
+        await self.writer.drain()
+        return await self.read()
+
+    async def read(self):
+        return json.loads(await asyncio.wait_for(self.reader.readline(), TIMEOUT))
+
+    async def event(self, name):
+        while True:
+            message = await self.read()
+            if message.get("event") == name:
+                return message
+
+    def close(self):
+        self.writer.close()
+
+
+def run_server(harness, tmp_path, scenario):
+    async def main():
+        server = RemoteControlServer(harness.recorder)
+        socket_path = str(tmp_path / "remote.sock")
+        listener = await server.start(socket_path=socket_path)
+        clients = []
+
+        async def connect():
+            client = Client(*await asyncio.open_unix_connection(socket_path))
+            clients.append(client)
+            return client
+
+        try:
+            return await scenario(server, connect)
+        finally:
+            for client in clients:
+                client.close()
+            listener.close()
+            server._worker.cancel()
+
+    return asyncio.run(main())
+
+
+def save_macro(harness, tmp_path):
+    harness.record(tap("a", 100) + tap("b", 300))
+    path = tmp_path / "macro.json"
+    harness.recorder.save_macro(str(path))
+    harness.recorder.clear_all()
+    return str(path)
+
+
+def test_load_play_stop_status_round_trip(harness, backend, tmp_path):
+    path = save_macro(harness, tmp_path)
+    gate = threading.Event()
+    started = threading.Event()
+
+    def hold_first_key(event):
+        if event[1:] == ("keyDown", "a") and not started.is_set():
+            started.set()
+            gate.wait(TIMEOUT)
+
+    async def scenario(server, connect):
+        events = await connect()
+        control = await connect()
+        assert (await events.request(cmd="subscribe"))["ok"]
+
+        load = await control.request(cmd="load", path=path)
+        assert load["ok"]
+        finished = await events.event("job_finished")
+        assert finished == {"event": "job_finished", "job": load["job"], "ok": True, "interrupted": False}
+        assert len(harness.recorder.snapshot_sections()) == 1
+
+        backend.reset()
+        backend.on_event = hold_first_key
+        play = await control.request(cmd="play")
+        queued = await control.request(cmd="play", step=2)
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, TIMEOUT)
+        status = await control.request(cmd="status")
+        assert status["state"] == "play" and status["job"] == play["job"] and status["queued"] == 1
+
+        stop = await control.request(cmd="stop", clear=True)
+        assert stop == {"ok": True, "cleared": 1}
+        gate.set()
+        finished = await events.event("job_finished")
+        assert finished["job"] == play["job"] and finished["ok"] and finished["interrupted"]
+        assert finished["checkpoint"] == {"section": 0, "step": 2}
+
+        status = await control.request(cmd="status")
+        assert status["state"] == "idle" and status["queued"] == 0
+        assert status["checkpoint"] == {"section": 0, "step": 2}
+        assert queued["job"] != status["job"]
+
+    run_server(harness, tmp_path, scenario)
+    assert backend.calls() == [("keyDown", "a"), ("keyUp", "a")]
+
+
+def test_bad_jobs_never_stop_the_worker(harness, backend, tmp_path):
+    path = save_macro(harness, tmp_path)
+
+    def backend_failure(event):
+        raise RuntimeError("display went away")
+
+    async def scenario(server, connect):
+        events = await connect()
+        control = await connect()
+        await events.request(cmd="subscribe")
+
+        for bad in ({"section": None}, {"step": -1}, {"section": "1"}, {"target": [0, 0, 0, 10]}):
+            reply = await control.request(cmd="play", **bad)
+            assert not reply["ok"] and "must be" in reply["error"]
+        assert not (await control.request(cmd="jump"))["ok"]
+
+        missing = await control.request(cmd="load", path=str(tmp_path / "missing.json"))
+        finished = await events.event("job_finished")
+        assert finished["job"] == missing["job"] and not finished["ok"]
+
+        backend.on_event = backend_failure
+        failing = await control.request(cmd="play", path=path)
+        finished = await events.event("job_finished")
+        assert finished["job"] == failing["job"] and not finished["ok"]
+        assert "RuntimeError: display went away" in finished["error"]
+
+        backend.on_event = None
+        backend.reset()
+        good = await control.request(cmd="play")
+        finished = await events.event("job_finished")
+        assert finished["job"] == good["job"] and finished["ok"]
+        assert (await control.request(cmd="status"))["state"] == "idle"
+
+    run_server(harness, tmp_path, scenario)
+    assert [c[0] for c in backend.calls()] == ["keyDown", "keyUp", "keyDown", "keyUp"]
@@ -0,0 +1,91 @@
+import gc
+import json
+import pickle
+import tracemalloc
+
+import pytest
+
+from harness import click, tap
+from step_records import StepRecord, compact_step, compact_steps, delay_step, key_step, steps_json
+
+
+def test_records_read_like_dicts():
+    step = compact_step({"type": "mouse_click", "x": 5, "y": 6, "button": "left", "hold": 90})
+    assert isinstance(step, StepRecord)
+    assert step["x"] == 5 and step.get("hold") == 90 and step.get("missing", 1) == 1
+    assert step == {"type": "mouse_click", "x": 5, "y": 6, "button": "left", "hold": 90}
+    assert dict(step, hold=10) == {"type": "mouse_click", "x": 5, "y": 6, "button": "left", "hold": 10}
+    assert list(step.items())[0] == ("type", "mouse_click")
+    assert "button" in step and "key" not in step
+    with pytest.raises(KeyError):
+        step["key"]
+    with pytest.raises(AttributeError):
+        step.x = 1
+
+
+def test_delays_and_keys_are_shared():
+    assert delay_step(120) is compact_step({"type": "delay", "delay": 120, "unit": "ms"})
+    assert key_step("press", "a") is compact_step({"type": "press", "key": "a"})
+    assert delay_step(1.5, "secs") == {"type": "delay", "delay": 1.5, "unit": "secs"}
+
+
+@pytest.mark.parametrize("step", [
+    {"type": "delay", "delay": 5},
+    {"type": "delay", "unit": "ms", "delay": 5},
+    {"type": "delay", "delay": True, "unit": "ms"},
+    {"type": "press", "key": "a", "note": "x"},
+    {"type": "mouse_press", "x": 1.5, "y": 2, "button": "left"},
+    {"type": "type_text", "text": "hi", "timing": [1]},
+])
+def test_unusual_steps_stay_dicts(step):
+    assert compact_step(step) is step
+
+
+def test_serialized_text_is_unchanged():
+    steps = [{"type": "delay", "delay": 5, "unit": "ms"}, {"type": "press", "key": "é"},
+             {"type": "type_text", "text": "x", "timing": [3]}, {"type": "delay", "delay": 5},
+             {"type": "mouse_release", "x": 1, "y": 2, "button": "right"}]
+    compact = compact_steps(steps)
+    assert "[" + steps_json(compact) + "]" == json.dumps(steps)
+    assert steps_json([]) == ""
+
+
+def test_records_pickle_back_to_shared_records():
+    step = key_step("release", "enter")
+    assert pickle.loads(pickle.dumps(step)) is step
+    click_step = compact_step({"type": "mouse_click", "x": 1, "y": 2, "button": "left", "hold": 3})
+    assert pickle.loads(pickle.dumps(click_step)) == click_step
+
+
+def test_recorder_stores_records(harness, tmp_path):
+    steps = harness.record(tap("a", 100) + click(4, 4, 200) + tap("b", 400))
+    assert all(isinstance(s, StepRecord) for s in steps)
+    path = tmp_path / "macro.json"
+    harness.recorder.save_macro(str(path))
+    harness.recorder.load_macro(str(path))
+    loaded = harness.recorder.snapshot_sections()[0]["steps"]
+    assert loaded == steps
+    assert loaded[1] is steps[1]
+
+
+def test_edit_delay_keeps_extra_keys(harness):
+    r = harness.recorder
+    r.load_data({"sections": [{"name": "s", "steps": [{"type": "delay", "delay": 5, "unit": "ms", "why": "x"}]}]})
+    r.edit_delay(0, 0, 9)
+    assert r.snapshot_sections()[0]["steps"] == [{"type": "delay", "delay": 9, "unit": "ms", "why": "x"}]
+
+
+def test_memory_per_step():
+    # benchmarks/memory_benchmark.py measures this at a million steps
+    text = json.dumps([step for i in range(20000) for step in (
+        {"type": "delay", "delay": i % 300, "unit": "ms"}, {"type": "press", "key": "abc"[i % 3]},
+        {"type": "delay", "delay": 80, "unit": "ms"}, {"type": "release", "key": "abc"[i % 3]})])
+    sizes = []
+    for hook in (None, compact_step):
+        gc.collect()
+        tracemalloc.start()
+        data = json.loads(text, object_hook=hook)
+        sizes.append(tracemalloc.get_traced_memory()[0])
+        tracemalloc.stop()
+        del data
+    assert sizes[0] >= 5 * sizes[1]
@@ -0,0 +1,141 @@
+import string
+import threading
+import time
+
+from fakes import Button
+from harness import RecordingHarness, TickingClock, VirtualClock, key_for, tap
+
+# Capture and replay must keep up with 10k input events per second. Each test
+# pushes several times that many events so a regression shows up as a failed
+# rate, not as flakiness.
+MIN_EVENTS_PER_SECOND = 10000
+EVENTS = 60000
+
+
+def _rate(count, seconds):
+    return count / max(seconds, 1e-9)
+
+
+def test_keyboard_capture_rate(backend):
+    h = RecordingHarness(backend, VirtualClock())
+    r = h.recorder
+    r.start_recording(r.add_section())
+    on_press, on_release = h._callback("on_press"), h._callback("on_release")
+    keys = [key_for(c) for c in string.ascii_lowercase]
+    start = time.perf_counter()
+    for i in range(EVENTS // 2):
+        key = keys[i % len(keys)]
+        h.clock.now += 0.003
+        on_press(key)
+        h.clock.now += 0.002
+        on_release(key)
+    elapsed = time.perf_counter() - start
+    r.stop_recording()
+    steps = r.snapshot_sections()[0]["steps"]
+    assert len(steps) == 2 * EVENTS
+    assert sum(s["delay"] for s in steps if s["type"] == "delay") == round(EVENTS / 2 * 5)
+    assert r.macro_duration_ms() == round(EVENTS / 2 * 5)
+    assert _rate(EVENTS, elapsed) >= MIN_EVENTS_PER_SECOND
+
+
+def test_typing_capture_rate(backend):
+    h = RecordingHarness(backend, VirtualClock())
+    r = h.recorder
+    r.coalesce_typing = True
+    script = []
+    at = 10
+    for word in range(EVENTS // 12):
+        script += tap("w", at, hold=20) + tap("o", at + 40, hold=20) + tap("r", at + 80, hold=20)
+        script += tap("d", at + 120, hold=20) + tap("space", at + 160, hold=20)
+        script += tap("enter", at + 200, hold=20)
+        at += 300
+    start = time.perf_counter()
+    steps = h.record(script)
+    elapsed = time.perf_counter() - start
+    texts = [s["text"] for s in steps if s["type"] == "type_text"]
+    assert texts == ["word "] * (EVENTS // 12)
+    assert _rate(len(script), elapsed) >= MIN_EVENTS_PER_SECOND
+
+
+def test_concurrent_listeners_and_ui_reader(backend):
+    # Keyboard and mouse callbacks arrive on their own threads while the UI
+    # keeps taking snapshots; nothing may be lost and neither side may starve
+    h = RecordingHarness(backend, TickingClock(step_ms=1))
+    r = h.recorder
+    r.start_recording(r.add_section())
+    on_press, on_release = h._callback("on_press"), h._callback("on_release")
+    on_click = h._callback("on_click")
+    key_taps = EVENTS // 4
+    clicks = EVENTS // 4
+    done = threading.Event()
+    snapshots = []
+    errors = []
+
+    def keyboard_thread():
+        keys = [key_for(c) for c in string.ascii_lowercase]
+        for i in range(key_taps):
+            on_press(keys[i % 26])
+            on_release(keys[i % 26])
+
+    def mouse_thread():
+        for i in range(clicks):
+            x = (i * 10) % 1900
+            on_click(x, 100, Button.left, True)
+            on_click(x, 100, Button.left, False)
+
+    def ui_thread():
+        while not done.is_set():
+            try:
+                sections, _gaps, revision, _tokens = r.frozen_snapshot()
+                snapshots.append((revision, len(sections[0]["steps"])))
+                r.macro_duration_ms()
+            except Exception as e:
+                errors.append(e)
+            time.sleep(0.005)
+
+    ui = threading.Thread(target=ui_thread)
+    ui.start()
+    feeders = [threading.Thread(target=keyboard_thread), threading.Thread(target=mouse_thread)]
+    start = time.perf_counter()
+    for t in feeders:
+        t.start()
+    for t in feeders:
+        t.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    ui.join()
+    r.stop_recording()
+
+    assert not errors
+    assert len(snapshots) >= 2
+    assert [rev for rev, _ in snapshots] == sorted(rev for rev, _ in snapshots)
+    steps = r.snapshot_sections()[0]["steps"]
+    counts = {}
+    for s in steps:
+        counts[s["type"]] = counts.get(s["type"], 0) + 1
+    assert counts["press"] == counts["release"] == key_taps
+    downs = counts.get("mouse_click", 0) + counts.get("mouse_press", 0)
+    ups = counts.get("mouse_click", 0) + counts.get("mouse_release", 0)
+    # Only the final click (taken as the stop click) may be trimmed
+    assert clicks - 1 <= downs <= clicks
+    assert clicks - 1 <= ups <= clicks
+    assert r.validate()["error_count"] == 0
+    assert _rate(2 * key_taps + 2 * clicks, elapsed) >= MIN_EVENTS_PER_SECOND
+
+
+def test_replay_rate(harness, backend):
+    r = harness.recorder
+    section = r.add_section()
+    r.load_data({"sections": [{"name": "big", "steps": [
+        step for i in range(EVENTS // 4) for step in (
+            {"type": "press", "key": "a"}, {"type": "delay", "delay": 1, "unit": "ms"},
+            {"type": "release", "key": "a"}, {"type": "delay", "delay": 1, "unit": "ms"})
+    ]}], "delays_between": []})
+    assert section == 0
+    harness.clock.set_ms(0)
+    start = time.perf_counter()
+    r.play_all()
+    elapsed = time.perf_counter() - start
+    assert len(backend.events) == EVENTS // 2
+    assert backend.events[-1] == (EVENTS // 2 - 1, "keyUp", "a")
+    assert _rate(EVENTS, elapsed) >= MIN_EVENTS_PER_SECOND